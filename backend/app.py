@@ -8,6 +8,10 @@ from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from database import db, init_db
+from seed import seed_database
+from service.story import get_story_graph
+from service.static_files import send_compressed, serve_static
+from service.log_indexer import start_indexer
 from routes.area_route import area_bp
 from routes.user_route import user_bp
 from routes.prescription_route import prescription_bp
@@ -24,12 +28,17 @@ from logging.handlers import RotatingFileHandler
 
 app = Flask(__name__, static_folder='static',static_url_path='/static')
 app.config.from_pyfile('config.py')  # Load the configuration file
+# /static goes through service/static_files.py: immutable hashed assets, .br/.gz sidecars, Range
+app.view_functions['static'] = serve_static
 
 # Initialize the database
 db.init_app(app)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 init_db(app)
+seed_database(app)  # No-op once the gunicorn master has seeded the database
+with app.app_context():
+    get_story_graph()  # Compile the story graph before the first request
 
 # Enable CORS
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -57,8 +66,9 @@ def serve_vue_app(path):
     if path.startswith("api"):
         return "Not Found", 404
 
-    # Let Flask return index.html, Vue Router handle the route
-    return send_from_directory("templates", "index.html")
+    # Let Flask return index.html, Vue Router handle the route. It names the hashed assets of the
+    # current build, so the browser revalidates it every time (no-cache, ETag)
+    return send_compressed("templates", "index.html")
 
 @app.route('/')
 def index():
@@ -104,6 +114,8 @@ def setup_logging():
 
 # Initialize the log configuration
 setup_logging()
+# Fold the access log into the rollups behind /api/admin/analyze-logs
+start_indexer(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
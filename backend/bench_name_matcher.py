@@ -0,0 +1,96 @@
+"""
+Benchmark of the herb <-> formula fuzzy linking: the original nested fuzz.ratio loops against
+service.name_matcher.NameMatcher, on the bundled Chinese catalog scaled 1x, 10x and 100x.
+
+    python bench_name_matcher.py [sample_size]
+
+The scaled catalogs add copies of every formula and herb whose names carry one extra character,
+so the copies are themselves fuzzy matches of the originals. The legacy loop is too slow to run
+for every herb of the large catalogs, so both approaches link the same sample of herbs; the
+results are checked to be identical and the full seeding time is extrapolated from the sample.
+"""
+
+import csv
+import os
+import random
+import sys
+import time
+
+from fuzzywuzzy import fuzz
+
+from database import split_constitute
+from service.name_matcher import NameMatcher, DEFAULT_THRESHOLD
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(filename, column):
+    with open(os.path.join(BASE_DIR, filename), mode='r', newline='', encoding='utf-8') as file:
+        return [row[column] for row in csv.reader(file)]
+
+
+def scale(names, factor):
+    # Copy j of a name gets one extra CJK character, different for every copy
+    return [name if j == 0 else name + chr(0x4e00 + (j * 7919) % 20000)
+            for j in range(factor) for name in names]
+
+
+def build_catalog(factor):
+    constitutes = load('chinese_herbs_data.csv', 1)
+    prescriptions = []
+    for j in range(factor):
+        for constitute in constitutes:
+            items = [item.lower() for item in split_constitute(constitute)]
+            if j:
+                items = [item + chr(0x4e00 + (j * 7919) % 20000) for item in items]
+            prescriptions.append((len(prescriptions) + 1, items))
+    herbs = scale(load('chinese_constitutes_data_updated.csv', 0), factor)
+    return prescriptions, herbs
+
+
+def legacy_relations(prescriptions, name):
+    relate = []
+    for pid, items in prescriptions:
+        for item in items:
+            if fuzz.ratio(name, item) >= DEFAULT_THRESHOLD:
+                relate.append(pid)
+                break
+    return relate
+
+
+def run(factor, sample_size):
+    prescriptions, herbs = build_catalog(factor)
+    sample = random.Random(factor).sample(herbs, min(sample_size, len(herbs)))
+
+    started = time.perf_counter()
+    legacy = [legacy_relations(prescriptions, name.strip().lower()) for name in sample]
+    legacy_time = (time.perf_counter() - started) / len(sample)
+
+    started = time.perf_counter()
+    index = {}
+    for pid, items in prescriptions:
+        for item in items:
+            index.setdefault(item, set()).add(pid)
+    matcher = NameMatcher(index)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matched = []
+    for name in sample:
+        relate = set()
+        for constituent in matcher.match(name.strip().lower()):
+            relate.update(index[constituent])
+        matched.append(sorted(relate))
+    matcher_time = (time.perf_counter() - started) / len(sample)
+
+    assert matched == legacy, f"NameMatcher differs from the legacy loop at {factor}x"
+    print(f"{factor:>4}x  {len(prescriptions):>6} formulas  {len(herbs):>6} herbs | "
+          f"legacy {legacy_time * 1000:9.2f} ms/herb (~{legacy_time * len(herbs):9.1f}s total) | "
+          f"matcher {matcher_time * 1000:7.3f} ms/herb + {build_time:.2f}s index "
+          f"(~{matcher_time * len(herbs) + build_time:7.2f}s total) | {legacy_time / matcher_time:6.0f}x faster")
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for catalog_factor in (1, 10, 100):
+        run(catalog_factor, size)
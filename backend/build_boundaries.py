@@ -0,0 +1,133 @@
+"""
+Build the bundled province boundary store (province_boundaries.json) used by /api/areas.
+
+    python build_boundaries.py [--cache cache] [--geojson provinces.geojson ...] [--step 25]
+                               [--geojson-step N] [--fill]
+
+Sources, later ones overriding earlier ones for the same province (with --fill, the GeoJSON
+files only add the provinces the cache lacks):
+  --cache    a directory of Nominatim responses with geojson (the cache/*.json files written by
+             osmnx); the first polygon result of each response is used, as osmnx did
+  --geojson  GeoJSON FeatureCollection files; a feature is matched to a province by an
+             "adcode" property or by an English or Chinese name in its properties
+
+Only the outer rings are kept, every `step`-th point, as [lat, lng], which is what the
+endpoint used to compute on every request. Simplified GeoJSON (e.g. the ECharts China map) has
+far fewer points than Nominatim polygons: sample it with a smaller --geojson-step.
+"""
+
+import argparse
+import json
+import os
+
+from service.provinces import BOUNDARY_FILE, PROVINCES, province_code
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NAMES = {code: (en, zh) for code, en, zh in PROVINCES}
+# Suffixes of the official Chinese names, e.g. 河北省, 广西壮族自治区
+ZH_SUFFIXES = ('省', '市', '自治区', '壮族自治区', '回族自治区', '维吾尔自治区', '特别行政区')
+
+
+def feature_code(properties):
+    adcode = properties.get('adcode')
+    if isinstance(adcode, (int, str)) and str(adcode).isdigit():
+        code = int(str(adcode)[:2])
+        if code in NAMES:
+            return code
+    for value in properties.values():
+        if not isinstance(value, str):
+            continue
+        value = value.strip()
+        code = province_code(value)
+        if code:
+            return code
+        for code, (en, zh) in NAMES.items():
+            if value.startswith(zh) and value[len(zh):] in ZH_SUFFIXES:
+                return code
+    return None
+
+
+def sample(ring, step):
+    return [[point[1], point[0]] for point in ring[::step]]
+
+
+def to_area(geometry, step):
+    if geometry['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': sample(geometry['coordinates'][0], step)}
+    if geometry['type'] == 'MultiPolygon':
+        return {'type': 'MultiPolygon',
+                'coordinates': [sample(polygon[0], step) for polygon in geometry['coordinates']]}
+    return None
+
+
+def from_cache(directory, step):
+    areas = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(directory, filename), mode='r', encoding='utf-8') as file:
+            results = json.load(file)
+        if not isinstance(results, list):
+            continue
+        for result in results:
+            area = to_area(result.get('geojson') or {'type': None}, step)
+            if area:
+                code = province_code(result.get('name', ''))
+                if code:
+                    areas.setdefault(code, area)
+                else:
+                    print(f"Skipped {filename}: {result.get('display_name')} is not a province")
+                break
+    return areas
+
+
+def from_geojson(path, step):
+    with open(path, mode='r', encoding='utf-8') as file:
+        collection = json.load(file)
+    areas = {}
+    for feature in collection.get('features', []):
+        code = feature_code(feature.get('properties') or {})
+        area = to_area(feature.get('geometry') or {'type': None}, step)
+        if code and area:
+            areas[code] = area
+    return areas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache', default=os.path.join(BASE_DIR, 'cache'))
+    parser.add_argument('--geojson', action='append', default=[])
+    parser.add_argument('--step', type=int, default=25)
+    parser.add_argument('--geojson-step', type=int, help='Step for the GeoJSON files, --step by default')
+    parser.add_argument('--fill', action='store_true', help='GeoJSON only adds provinces missing from the cache')
+    parser.add_argument('--output', default=str(BOUNDARY_FILE))
+    args = parser.parse_args()
+
+    areas = {}
+    sources = []
+    if os.path.isdir(args.cache):
+        areas.update(from_cache(args.cache, args.step))
+        sources.append(os.path.relpath(args.cache, BASE_DIR))
+    geojson_step = args.geojson_step or args.step
+    for path in args.geojson:
+        for code, area in from_geojson(path, geojson_step).items():
+            if not (args.fill and code in areas):
+                areas[code] = area
+        sources.append(os.path.basename(path))
+
+    provinces = {}
+    for code in sorted(areas):
+        en, zh = NAMES[code]
+        provinces[str(code)] = {'en': en, 'zh': zh, **areas[code]}
+    with open(args.output, mode='w', encoding='utf-8') as file:
+        json.dump({'step': args.step, 'sources': sources, 'provinces': provinces}, file,
+                  ensure_ascii=False, separators=(',', ':'))
+
+    missing = [en for code, (en, zh) in NAMES.items() if code not in areas]
+    print(f"Wrote {len(provinces)} provinces to {args.output}")
+    if missing:
+        print(f"Missing: {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Build the precompressed sidecars served by service/static_files.py.
+
+    python compress_static.py [--min-size 1024] [directory ...]
+
+For every compressible file (see COMPRESSIBLE) of static/ and templates/, writes file.gz and,
+when the optional `brotli` package is installed, file.br next to it. Run it after copying a
+new frontend build in; files whose sidecars are newer than the file itself are skipped, and
+sidecars that would not be smaller are not written.
+"""
+
+import argparse
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # Only .gz sidecars then
+    brotli = None
+
+from service.static_files import COMPRESSIBLE, SIDECARS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUFFIXES = tuple(suffix for _, suffix in SIDECARS)
+
+
+def compressors():
+    result = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli:
+        result.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return result
+
+
+def compress_file(path, min_size):
+    """Returns the sidecars written for this file"""
+    size = os.path.getsize(path)
+    if size < min_size:
+        return []
+    written = []
+    data = None
+    for suffix, compress in compressors():
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= size:
+            # Not worth it: drop a stale sidecar so the plain file gets served
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written.append(target)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directories', nargs='*',
+                        default=[os.path.join(BASE_DIR, 'static'), os.path.join(BASE_DIR, 'templates')])
+    parser.add_argument('--min-size', type=int, default=1024)
+    args = parser.parse_args()
+
+    if not brotli:
+        print("brotli is not installed, only writing .gz sidecars")
+    count = 0
+    for directory in args.directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(SUFFIXES) or os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                    continue
+                for target in compress_file(os.path.join(root, name), args.min_size):
+                    print(f"Wrote {os.path.relpath(target, BASE_DIR)}")
+                    count += 1
+    print(f"{count} sidecars written")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+import httpx
 from openai import OpenAI
 
 # Database configuration
@@ -10,7 +11,10 @@ SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'database.db')
 # JWT configuration
 JWT_SECRET_KEY = 'your_secret_key'
 
-client = OpenAI(api_key="sk-6b2c67a266834cb7a373f5ee07f510ba", base_url="https://api.deepseek.com")
+# Timeouts and a keep-alive connection pool, see service/llm_gateway.py
+from service.llm_gateway import http_options
+client = OpenAI(api_key="sk-6b2c67a266834cb7a373f5ee07f510ba", base_url="https://api.deepseek.com",
+                max_retries=1, http_client=httpx.Client(**http_options()))
 
 headers = {
     'Accept': 'application/json',
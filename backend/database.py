@@ -2,9 +2,9 @@ from datetime import datetime
 
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, text
 import json
-import csv
-from fuzzywuzzy import fuzz
+import re
 
 # Create a database object, but don't initialize Flask
 db = SQLAlchemy()
@@ -21,6 +21,7 @@ class User(db.Model):
     age = db.Column(db.Integer, unique=False, nullable=True)
     role = db.Column(db.String(80), unique=False, nullable=False, default='client')
     avatar = db.Column(db.String, unique=False, nullable=True)
+    avatar_thumb = db.Column(db.String, unique=False, nullable=True)  # Small variant for lists
 
     def __repr__(self):
         return f"<User {self.username}>"
@@ -91,6 +92,205 @@ class ChineseHerb(db.Model):
         return f"<Chinese Herb {self.name, self.category, self.origin}>"
 
 
+# Prescription <-> herb links. `position` is the index of the herb in the prescription's
+# constitute list; it is NULL for links that only come from fuzzy name matching.
+class PrescriptionHerb(db.Model):
+    __table_args__ = (
+        db.Index('ix_prescription_herb_herb_id', 'herb_id'),
+    )
+
+    prescription_id = db.Column(db.Integer, primary_key=True)
+    herb_id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<PrescriptionHerb {self.prescription_id, self.herb_id}>"
+
+
+class ChinesePrescriptionHerb(db.Model):
+    __table_args__ = (
+        db.Index('ix_chinese_prescription_herb_herb_id', 'herb_id'),
+    )
+
+    prescription_id = db.Column(db.Integer, primary_key=True)
+    herb_id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<Chinese PrescriptionHerb {self.prescription_id, self.herb_id}>"
+
+
+# Herb -> provinces parsed from production_regions (see service/provinces.py). `position` keeps
+# the order in which the provinces appear in the text.
+class HerbProvince(db.Model):
+    __table_args__ = (
+        db.Index('ix_herb_province_province_code', 'province_code'),
+    )
+
+    herb_id = db.Column(db.Integer, primary_key=True)
+    province_code = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<HerbProvince {self.herb_id, self.province_code}>"
+
+
+class ChineseHerbProvince(db.Model):
+    __table_args__ = (
+        db.Index('ix_chinese_herb_province_province_code', 'province_code'),
+    )
+
+    herb_id = db.Column(db.Integer, primary_key=True)
+    province_code = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<Chinese HerbProvince {self.herb_id, self.province_code}>"
+
+
+def split_constitute(constitute):
+    """'A; B; C' -> ['A', 'B', 'C']"""
+    return [item.strip() for item in (constitute or '').split(';') if item.strip()]
+
+
+def populate_prescription_herbs(herb_model, prescription_model, link_model):
+    """
+    Migration: build the link table from Prescription.constitute (exact names, with position)
+    and Herb.relate_prescription (JSON id list, which also holds the fuzzy matches)
+    """
+    herb_ids = {}
+    herbs = herb_model.query.order_by(herb_model.id).all()
+    for herb in herbs:
+        herb_ids.setdefault(herb.name.strip().lower(), []).append(herb.id)
+
+    links = {}
+    prescription_ids = set()
+    for prescription in prescription_model.query.all():
+        prescription_ids.add(prescription.id)
+        for position, name in enumerate(split_constitute(prescription.constitute)):
+            for herb_id in herb_ids.get(name.lower(), ()):
+                links.setdefault((prescription.id, herb_id), position)
+    for herb in herbs:
+        try:
+            relate_ids = json.loads(herb.relate_prescription or '[]')
+        except ValueError:
+            relate_ids = []
+        for pid in relate_ids:
+            if pid in prescription_ids:
+                links.setdefault((pid, herb.id), None)
+
+    db.session.execute(link_model.__table__.insert(), [
+        {'prescription_id': pid, 'herb_id': hid, 'position': position}
+        for (pid, hid), position in links.items()
+    ])
+    db.session.commit()
+
+
+# Full-text search. Chinese text is indexed one character per token (the unicode61 tokenizer
+# would otherwise keep a whole run of Chinese as one token), so a query of any length becomes a
+# phrase of single characters. Latin words are kept whole and are queried by prefix.
+CJK_PATTERN = re.compile(r'([\u3400-\u9fff\uf900-\ufaff])')
+
+SEARCH_TABLES = {
+    # FTS table: (source table, indexed columns, bm25 column weights)
+    'herb_fts': ('herb', ('name', 'functions', 'properties'), (10.0, 1.0, 1.0)),
+    'chinese_herb_fts': ('chinese_herb', ('name', 'functions', 'properties'), (10.0, 1.0, 1.0)),
+    'prescription_fts': ('prescription', ('name', 'action', 'indication'), (10.0, 1.0, 1.0)),
+    'chinese_prescription_fts': ('chinese_prescription', ('name', 'action', 'indication'), (10.0, 1.0, 1.0)),
+}
+
+
+# Rows inserted or updated since they were last indexed. The triggers are plain SQL and only queue
+# the row here, so any SQLite client (the sqlite3 CLI, scripts) can write the tables; the app
+# tokenizes the queued rows in Python before searching (see sync_search).
+SEARCH_PENDING = 'search_pending'
+FTS_CHUNK_SIZE = 500
+
+
+def fts_tokens(value):
+    """Text as stored in the FTS tables: every Chinese character on its own"""
+    if not value:
+        return ''
+    return CJK_PATTERN.sub(r' \1 ', value)
+
+
+def index_search_rows(fts_table, ids=None):
+    """(Re)index the given rows of the source table of fts_table, all of them when ids is None"""
+    table, columns, _ = SEARCH_TABLES[fts_table]
+    column_list = ', '.join(columns)
+    insert = text(f"INSERT INTO {fts_table}(rowid, {column_list}) "
+                  f"VALUES (:id, {', '.join(':' + column for column in columns)})")
+    select = text(f"SELECT id, {column_list} FROM {table}")
+    chunks = [None]
+    if ids is not None:
+        select = text(f"SELECT id, {column_list} FROM {table} WHERE id IN :ids") \
+            .bindparams(bindparam('ids', expanding=True))
+        delete = text(f"DELETE FROM {fts_table} WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True))
+        ids = sorted(ids)
+        chunks = [ids[i:i + FTS_CHUNK_SIZE] for i in range(0, len(ids), FTS_CHUNK_SIZE)]
+    for chunk in chunks:
+        if chunk is not None:
+            db.session.execute(delete, {'ids': chunk})
+        rows = [{'id': row['id'], **{column: fts_tokens(row[column]) for column in columns}}
+                for row in db.session.execute(select, {} if chunk is None else {'ids': chunk}).mappings()]
+        if rows:
+            db.session.execute(insert, rows)
+
+
+def sync_search():
+    """Index the rows queued by the triggers, in one transaction. Returns their number."""
+    if not db.session.execute(text(f"SELECT 1 FROM {SEARCH_PENDING} LIMIT 1")).first():
+        return 0
+    # Take the write lock first, so no row can be queued between reading the queue and emptying it
+    db.session.execute(text(f"DELETE FROM {SEARCH_PENDING} WHERE 0"))
+    pending = db.session.execute(text(f"SELECT fts_table, id FROM {SEARCH_PENDING}")).all()
+    ids = {}
+    for fts_table, row_id in pending:
+        if fts_table in SEARCH_TABLES:
+            ids.setdefault(fts_table, []).append(row_id)
+    for fts_table, table_ids in ids.items():
+        index_search_rows(fts_table, table_ids)
+    db.session.execute(text(f"DELETE FROM {SEARCH_PENDING}"))
+    db.session.commit()
+    return len(pending)
+
+
+def init_search():
+    """
+    Create the FTS5 tables and the triggers keeping them in sync, and index existing rows.
+    Returns the number of tables that had to be indexed.
+    """
+    indexed = 0
+    db.session.execute(text(f"CREATE TABLE IF NOT EXISTS {SEARCH_PENDING} (fts_table TEXT NOT NULL, "
+                            f"id INTEGER NOT NULL, PRIMARY KEY (fts_table, id)) WITHOUT ROWID"))
+    for fts_table, (table, columns, _) in SEARCH_TABLES.items():
+        column_list = ', '.join(columns)
+        queue = f"INSERT OR IGNORE INTO {SEARCH_PENDING}(fts_table, id) VALUES ('{fts_table}', new.id);"
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({column_list}, "
+            f"tokenize = 'unicode61 remove_diacritics 2')",
+            # Recreated every time: the first version called an app-only SQL function
+            f"DROP TRIGGER IF EXISTS {fts_table}_ai",
+            f"DROP TRIGGER IF EXISTS {fts_table}_ad",
+            f"DROP TRIGGER IF EXISTS {fts_table}_au",
+            f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {table} BEGIN {queue} END",
+            f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {fts_table} WHERE rowid = old.id; END",
+            f"CREATE TRIGGER {fts_table}_au AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM {fts_table} WHERE rowid = old.id; {queue} END",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+        if not db.session.execute(text(f"SELECT 1 FROM {fts_table} LIMIT 1")).first():
+            index_search_rows(fts_table)
+            db.session.execute(text(f"DELETE FROM {SEARCH_PENDING} WHERE fts_table = :fts_table"),
+                               {'fts_table': fts_table})
+            indexed += 1
+    db.session.commit()
+    sync_search()
+    return indexed
+
+
 class ChatHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
@@ -132,10 +332,32 @@ class Score(db.Model):
         return f"<Score {self.username}>"
 
 
+# Every quiz submission, append-only. Rank ('herb' quiz) and Score ('prescription' quiz) hold
+# the per-player rollups of these rows.
+class QuizAttempt(db.Model):
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_username', 'username', 'quiz', 'created_at'),
+        db.Index('ix_quiz_attempt_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    quiz = db.Column(db.String(20), nullable=False)
+    username = db.Column(db.String, nullable=False)
+    accuracy = db.Column(db.Float, nullable=False)
+    totalTime = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<QuizAttempt {self.quiz, self.username}>"
+
+
 class Image(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     imageUrl_en = db.Column(db.String, nullable=False)
     imageUrl_zh = db.Column(db.String, nullable=False)
+    # Resized variants of uploaded banners, JSON (see service/images.py)
+    variants_en = db.Column(db.Text, nullable=True)
+    variants_zh = db.Column(db.Text, nullable=True)
 
     def __repr__(self):
         return f"<Image {self.imageUrl}>"
@@ -152,6 +374,75 @@ class HealthySuggestion(db.Model):
         return f"<HealthySuggestion {self.username}>"
 
 
+# Health suggestions shared by similar profiles: the key is the (age, height, weight) bands and
+# the month, see service/health_suggestion.py
+class SuggestionCache(db.Model):
+    key = db.Column(db.String, primary_key=True)
+    suggestion_en = db.Column(db.String, nullable=False)
+    suggestion_zh = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SuggestionCache {self.key}>"
+
+
+# Chatbot answers shared by every worker, keyed by the normalized question, see
+# service/answer_cache.py. last_used drives the LRU eviction.
+class AnswerCache(db.Model):
+    __table_args__ = (
+        db.Index('ix_answer_cache_last_used', 'last_used'),
+    )
+
+    key = db.Column(db.String(40), primary_key=True)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AnswerCache {self.question}>"
+
+
+# Hourly request counters built from the gunicorn access log by service/log_indexer.py.
+# kind is 'page' (dashboard page), 'route' (method and Flask rule) or 'status'.
+class AccessRollup(db.Model):
+    __table_args__ = (
+        db.PrimaryKeyConstraint('kind', 'key', 'hour'),
+        db.Index('ix_access_rollup_hour', 'kind', 'hour'),
+    )
+
+    kind = db.Column(db.String(10), nullable=False)
+    key = db.Column(db.String(500), nullable=False)
+    hour = db.Column(db.DateTime, nullable=False)  # UTC, truncated to the hour
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AccessRollup {self.kind, self.key, self.hour}>"
+
+
+# How far each log file has been indexed; inode tells a rotated file from the current one, and head
+# (hash of the first line) a copied or moved file, which gets a new inode, from a new one
+class LogOffset(db.Model):
+    path = db.Column(db.String, primary_key=True)  # File name of the log, e.g. gunicorn_access.log
+    inode = db.Column(db.Integer, nullable=False)
+    head = db.Column(db.String(40))
+    offset = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LogOffset {self.path}:{self.offset}>"
+
+
+# Counters shared by the workers (cache hits and misses...), incremented with an upsert
+class Counter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Counter {self.name}={self.value}>"
+
+
 class StoryMode(db.Model):
     __table_args__ = (
         db.PrimaryKeyConstraint('story_number', 'id'),  # Composite primary key
@@ -172,184 +463,63 @@ class StoryMode(db.Model):
     option_en = db.Column(db.String, nullable=True)
 
 
-# Initialize the database and insert the default data
+# Leaderboard indexes. The score index is on the expression the leaderboards sort by (see
+# service/leaderboard.py), so top-k pages and rank counts walk the index instead of sorting the
+# table. SQLAlchemy cannot reflect expression indexes, hence the plain DDL.
+LEADERBOARD_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_rank_score ON rank (accuracy - 0.03 * "totalTime" DESC, id)',
+    'CREATE INDEX IF NOT EXISTS ix_score_score ON score (accuracy - 0.03 * "totalTime" DESC, id)',
+    # One row per player: the conflict target of the rollup upserts. Replaces the plain indexes.
+    'DROP INDEX IF EXISTS ix_rank_username',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_rank_username ON rank (username)',
+    'DROP INDEX IF EXISTS ix_score_username',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_score_username ON score (username)',
+]
+
+
+# Columns added to existing tables; create_all only creates missing tables
+ADDED_COLUMNS = {
+    'user': {'avatar_thumb': 'VARCHAR'},
+    'image': {'variants_en': 'TEXT', 'variants_zh': 'TEXT'},
+    'log_offset': {'head': 'VARCHAR(40)'},
+}
+
+
+def add_missing_columns():
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in db.session.execute(text(f'PRAGMA table_info("{table}")'))}
+        for name, column_type in columns.items():
+            if name not in existing:
+                db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {column_type}'))
+    db.session.commit()
+
+
+def merge_duplicate_players(model):
+    """
+    Migration: the old read-modify-write could race and create a second row for a player.
+    Fold such rows into the lowest id, weighting the averages by the number of attempts.
+    """
+    duplicates = db.session.query(model.username).group_by(model.username) \
+        .having(db.func.count(model.id) > 1).all()
+    for (username,) in duplicates:
+        rows = model.query.filter_by(username=username).order_by(model.id).all()
+        keep = rows[0]
+        attempts = sum(row.time for row in rows) or 1
+        keep.accuracy = sum(row.accuracy * row.time for row in rows) / attempts
+        keep.totalTime = sum(row.totalTime * row.time for row in rows) / attempts
+        keep.time = attempts
+        for row in rows[1:]:
+            db.session.delete(row)
+    db.session.commit()
+
+
+# Create the tables. The default data is inserted by the seeding stage in seed.py.
 def init_db(app):
     with app.app_context():
         db.create_all()
-
-        # Avoid repeated insertions
-        if not User.query.first():
-            default_users = [
-                User(username="Admin", password="$2b$12$FeqB4xc26Krjgis.11iVy./elyAnsTHsXmmAFK.QRDlU9JsxzVDfq",
-                     role='admin', avatar='/static/assets/BlankAvatar-Cl_LpKw_.png'),
-                User(username="Client", password="$2b$12$FeqB4xc26Krjgis.11iVy./elyAnsTHsXmmAFK.QRDlU9JsxzVDfq",
-                     avatar='/static/assets/BlankAvatar-Cl_LpKw_.png'),
-            ]
-            db.session.add_all(default_users)
-            db.session.commit()
-            print("Default user data has been inserted!")
-
-
-        if not Area.query.first():
-            default_areas = [
-                Area(type="polygon", coordinates=json.dumps([[39.8704, 116.4716], [39.8781, 116.4715],
-                                                             [39.8781, 116.4772], [39.8749, 116.4797],
-                                                             [39.8745, 116.4831], [39.8728, 116.4828],
-                                                             [39.8702, 116.4797]])),
-            ]
-            db.session.add_all(default_areas)
-            db.session.commit()
-            print("Default region data has been inserted!")
-
-        if not Image.query.first():
-            default_images = [
-                Image(imageUrl_en='https://pic4.zhimg.com/v2-000f1c1ae3e7ae215e216912aa81e647_720w.jpg?source=172ae18b',
-                      imageUrl_zh='https://pic4.zhimg.com/v2-000f1c1ae3e7ae215e216912aa81e647_720w.jpg?source=172ae18b'),
-                Image(imageUrl_en='https://bpic.588ku.com/back_list_pic/20/08/04/42586bb0e728cda777e35e774986df52.jpg!/fh/300/quality/90/unsharp/true/compress/true',
-                      imageUrl_zh='https://bpic.588ku.com/back_list_pic/20/08/04/42586bb0e728cda777e35e774986df52.jpg!/fh/300/quality/90/unsharp/true/compress/true'),
-                Image(imageUrl_en='https://oss.cyzone.cn/2022/0104/f39b42dfe92daac729eb9d2d28ec6d48.jpg',
-                      imageUrl_zh='https://oss.cyzone.cn/2022/0104/f39b42dfe92daac729eb9d2d28ec6d48.jpg')
-            ]
-            db.session.add_all(default_images)
-            db.session.commit()
-            print("The default homepage image is inserted")
-
-        if not Prescription.query.first():
-            # Open the CSV file
-            with open('herbs_data.csv', mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                # Go through each row
-                for row in reader:
-                    constituteNumber = len(row[1].split(';'))
-                    pre = Prescription(name=row[0], constitute=row[1], action=row[2], indication=row[3],
-                                       constituteNumber=constituteNumber)
-                    db.session.add(pre)
-                    db.session.commit()
-            print("The default EN prescription data is inserted")
-
-        if not ChinesePrescription.query.first():
-            # Open the CSV file
-            with open('chinese_herbs_data.csv', mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                # Go through each row
-                for row in reader:
-                    constituteNumber = len(row[1].split(';'))
-                    pre = ChinesePrescription(name=row[0], constitute=row[1], action=row[2], indication=row[3],
-                                              constituteNumber=constituteNumber)
-                    db.session.add(pre)
-                    db.session.commit()
-            print("The default CH prescription data is inserted")
-
-        if not Herb.query.first():
-            with open('Updated_Constitutes_Data.csv', mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for row in reader:
-                    prescriptions = Prescription.query.all()
-                    relate = []
-                    for prescription in prescriptions:
-                        cons = prescription.constitute
-                        result = cons.split(';')
-                        stander_result = [item.strip().lower() for item in result]
-                        stander_name = row[0].strip().lower()
-                        if stander_name in stander_result:
-                            relate.append(prescription.id)
-                    relate_json = json.dumps(relate)
-                    herb = Herb(name=row[0], category=row[1], origin=row[2], production_regions=row[3],
-                                properties=row[4], functions=row[5], image=row[6], relate_prescription=relate_json,
-                                classification=row[7])
-                    db.session.add(herb)
-                    db.session.commit()
-                print("By default, EN drugs are inserted")
-
-        if not ChineseHerb.query.first():
-            with open('chinese_constitutes_data_updated.csv', mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for row in reader:
-                    prescriptions = ChinesePrescription.query.all()
-                    relate = []
-                    for prescription in prescriptions:
-                        cons = prescription.constitute
-                        result = cons.split(';')
-                        stander_result = [item.strip().lower() for item in result]
-                        stander_name = row[0].strip().lower()
-                        # Fuzzy matching
-                        for item in stander_result:
-                            # Use fuzz.ratio to calculate similarity
-                            similarity = fuzz.ratio(stander_name, item)
-                            if similarity >= 80:  # Set a similarity threshold
-                                relate.append(prescription.id)
-                                break  # If the match is successful, the loop is jumped
-                    relate_json = json.dumps(relate)
-                    herb = ChineseHerb(name=row[0], category=row[1], origin=row[2], production_regions=row[3],
-                                       properties=row[4], functions=row[5], image=row[6],
-                                       relate_prescription=relate_json, classification=row[7])
-                    db.session.add(herb)
-                    db.session.commit()
-                print("The default CH drug is inserted")
-
-        # Quotation mark repair function
-        def fix_json_array(raw):
-            if not raw or str(raw).strip() in ("", "[]"):
-                return []
-            try:
-                s = str(raw).strip()
-                if s.startswith('"') and s.endswith('"'):
-                    s = s[1:-1]
-                s = s.replace('""', '"')
-                return json.loads(s)
-            except Exception as e:
-                print(f"Field repair failed: {raw} → {e}")
-                return []
-
-        # Data insertion logic
-        if not StoryMode.query.first():
-            with open('visual_novel_huoxiang_tree converted_file_utf8.csv', mode='r', newline='',
-                      encoding='utf-8') as file:
-                reader = csv.reader(file)
-
-                def get_image_url(image_filename):
-                    return f"/static/Story/{image_filename}"
-
-                for row in reader:
-                    try:
-                        # Fix options, redirects, and English options fields
-                        option = json.dumps(fix_json_array(row[5]))
-                        next_ids = json.dumps(fix_json_array(row[6]))
-                        option_en = json.dumps(fix_json_array(row[12]))
-
-                        # Background image URL stitching
-                        bg_image_url = get_image_url(row[7])
-
-                        # Fixed the character portrait field as a path array
-                        raw_image_json = row[8].strip()
-                        image_filenames = fix_json_array(raw_image_json)
-                        image_urls = [
-                            f"/static/Story/character_image/{name.strip()}"
-                            for name in image_filenames if name.strip()
-                        ]
-                        character_image_json = json.dumps(image_urls)
-
-                        story = StoryMode(
-                            story_number=row[0],
-                            id=row[1],
-                            scene=row[2],
-                            character=row[3],
-                            text=row[4],
-                            option=option,
-                            next=next_ids,
-                            bg_image=bg_image_url,
-                            character_image=character_image_json,
-                            audio_file=row[9],
-                            character_en=row[10],
-                            text_en=row[11],
-                            option_en=option_en
-                        )
-
-                        db.session.add(story)
-                        db.session.commit()
-                    except Exception as e:
-                        print(f"Failed to insert a record")
-
-            print('Story insert successfully')
-
-
+        add_missing_columns()
+        merge_duplicate_players(Rank)
+        merge_duplicate_players(Score)
+        for statement in LEADERBOARD_INDEXES:
+            db.session.execute(text(statement))
+        db.session.commit()
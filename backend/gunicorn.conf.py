@@ -3,6 +3,10 @@ import multiprocessing
 # Log configuration
 bind = "127.0.0.1:5000"  # Binding port
 workers = multiprocessing.cpu_count() * 2 + 1  # Number of workers
+# Threaded workers: a streaming chat answer (Server-Sent Events) holds one thread, not the whole
+# worker, and the worker keeps sending its heartbeat, so `timeout` does not kill long answers
+worker_class = "gthread"
+threads = 8
 accesslog = "./logs/gunicorn_access.log"  # Access log path
 errorlog = "./logs/gunicorn_error.log"  # Error log path
 loglevel = "info"  # Log level
@@ -10,3 +14,9 @@ capture_output = True  # Capture the print/logging output of Flask
 timeout = 30  # Timeout Period (seconds)
 
 limit_request_line = 4094  # Maximum request header size
+
+
+def on_starting(server):
+    # Seed the database once in the master, before any worker is forked
+    from seed import main
+    main()
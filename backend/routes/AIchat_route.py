@@ -2,6 +2,9 @@ import os, time
 from pathlib import Path
 from flask import current_app as app, Blueprint, jsonify, request, redirect
 from service.coze_client import coze_client, NeedReauthorize
+from service.sse import sse_response
+from service.answer_cache import cached_chat, cached_stream
+from service.llm_gateway import Overloaded, gated, gated_stream, overload_response
 from config import config
 
 aichat_bp = Blueprint('aichat', __name__, url_prefix='/api/chat')
@@ -108,13 +111,18 @@ def BianQue():
         return jsonify({'error': 'Message required'}), 400
 
     try:
-        answer = coze_client.safe_chat(question)
+        # 常见问题直接从共享缓存返回
+        answer = cached_chat(gated('coze', coze_client.safe_chat), question)
         return jsonify({'message': answer}), 200
 
     except NeedReauthorize:
         # 直接返回 401，不再返回 JSON 链接，前端拦截后打开 /auth-url
         return '', 401
 
+    except Overloaded as e:
+        # 并发已满，快速返回 429/503
+        return overload_response(e)
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -133,4 +141,27 @@ def BianQue():
     #     }), 401
     #
     # except Exception as e:
-    #     return jsonify({'error': str(e)}), 500
\ No newline at end of file
+    #     return jsonify({'error': str(e)}), 500
+
+
+@aichat_bp.route('/BianQue/stream', methods=['POST'])
+def BianQueStream():
+    """
+    流式版本：以 Server-Sent Events 逐段返回回答（event: message / done / error）
+    """
+    data = request.get_json()
+    question = data.get('question')
+    if not question:
+        return jsonify({'error': 'Message required'}), 400
+
+    try:
+        return sse_response(cached_stream(gated_stream('coze', coze_client.stream_chat), question))
+
+    except NeedReauthorize:
+        return '', 401
+
+    except Overloaded as e:
+        return overload_response(e)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
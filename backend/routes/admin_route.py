@@ -1,15 +1,15 @@
 import json
 import os
-import re
-import time
 
-from flask import Blueprint, jsonify, request
-from fuzzywuzzy import fuzz
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_bcrypt import Bcrypt
-from werkzeug.utils import secure_filename
-from collections import defaultdict
+from datetime import datetime
 
 from database import db, Herb, Prescription, ChinesePrescription, ChineseHerb, User, Image
+from service import answer_cache, log_indexer, log_tail, provinces, relations
+from service.images import InvalidImage, process_uploads, set_avatar
+from service.catalog import bump_version
+from service.llm_gateway import gateway
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -30,6 +30,8 @@ def allowed_file(filename):
 # The location where the logs are stored
 GUNICORN_ACCESS_LOG = "logs/gunicorn_access.log"
 GUNICORN_ERROR_LOG = "logs/gunicorn_error.log"
+LOG_PAGE_SIZE = 1000  # Lines per log returned by /log
+LOG_MAX_PAGE_SIZE = 10000
 
 
 @admin_bp.route('/addHerb', methods=['POST'])
@@ -54,42 +56,14 @@ def add_herb():
     classification_en = data.get('classification_en')
     classification_zh = data.get('classification_zh')
 
-    prescriptions_en = Prescription.query.all()
-    relate_en = []
-    for prescription in prescriptions_en:
-        cons = prescription.constitute
-        result = cons.split(';')
-        stander_result = [item.strip().lower() for item in result]
-        stander_name = name_en.strip().lower()
-        if stander_name in stander_result:
-            relate_en.append(prescription.id)
-    relate_json_en = json.dumps(relate_en)
-
-    prescriptions_zh = ChinesePrescription.query.all()
-    relate_zh = []
-    for prescription in prescriptions_zh:
-        cons = prescription.constitute
-        result = cons.split(';')
-        stander_result = [item.strip().lower() for item in result]
-        stander_name = name_zh.strip().lower()
-
-        # Fuzzy matching
-        for item in stander_result:
-            similarity = fuzz.ratio(stander_name, item)
-            if similarity >= 80:
-                relate_zh.append(prescription.id)
-                break
-
-    relate_json_zh = json.dumps(relate_zh)
-
     if standardAction == 1:
         herb = Herb(name=name_en, category=category_en, origin=origin_en, production_regions=production_regions_en,
                     properties=properties_en, functions=functions_en, image=image_en, classification=classification_en,
-                    relate_prescription=relate_json_en)
+                    relate_prescription='[]')
         cHerb = ChineseHerb(name=name_zh, category=category_zh, origin=origin_zh,
                             production_regions=production_regions_zh,
                             properties=properties_zh, functions=functions_zh, image=image_zh,
-                            classification=classification_zh, relate_prescription=relate_json_zh)
+                            classification=classification_zh, relate_prescription='[]')
         db.session.add(herb)
         db.session.add(cHerb)
     else:
@@ -104,7 +78,6 @@ def add_herb():
         herb.functions = functions_en
         herb.image_en = image_en
         herb.classification = classification_en
-        herb.relate_prescription = relate_json_en
 
         cHerb.name = name_zh
         cHerb.category = category_zh
@@ -114,9 +87,15 @@ def add_herb():
         cHerb.functions = functions_zh
         cHerb.image_en = image_zh
         cHerb.classification = classification_zh
-        cHerb.relate_prescription = relate_json_zh
 
+    # Only the links of this herb are recomputed, in the same transaction
+    db.session.flush()
+    relations.save_herb('en', herb)
+    relations.save_herb('zh', cHerb)
+    provinces.save_herb_provinces('en', herb)
+    provinces.save_herb_provinces('zh', cHerb)
     db.session.commit()
+    bump_version()
     return jsonify({'message': 'Success!'})
 
 
@@ -128,7 +107,12 @@ def delete_herb():
     cHerb = ChineseHerb.query.filter_by(id=id).first()
     db.session.delete(herb)
     db.session.delete(cHerb)
+    relations.delete_herb('en', id)
+    relations.delete_herb('zh', id)
+    provinces.delete_herb_provinces('en', id)
+    provinces.delete_herb_provinces('zh', id)
     db.session.commit()
+    bump_version()
     return jsonify({
         'code': 0,
         'message': 'Success!',
@@ -174,7 +158,12 @@ def add_prescription():
         cPre.action = action_zh
         cPre.indication = indication_zh
         cPre.constituteNumber = constituteNumber
+    # Relinks this prescription and refreshes relate_prescription of the herbs it gained or lost
+    db.session.flush()
+    relations.save_prescription('en', pre)
+    relations.save_prescription('zh', cPre)
     db.session.commit()
+    bump_version()
     return jsonify({'message': 'Success!'})
 
 
@@ -232,46 +221,51 @@ def delete_prescription_group():
     if not pre_en and not pre_zh:
         return jsonify({'error': 'Neither prescription found'}), 404
 
-    deleted_ids = []
+    # Only the herbs linked to this prescription are touched, all in one transaction
     if pre_en:
-        deleted_ids.append(pre_en.id)
         db.session.delete(pre_en)
-        db.session.commit()
+        relations.delete_prescription('en', pre_en.id)
     if pre_zh:
-        deleted_ids.append(pre_zh.id)
         db.session.delete(pre_zh)
-        db.session.commit()
+        relations.delete_prescription('zh', pre_zh.id)
+    db.session.commit()
 
-    # Update the relate_prescription field for all Herbs
-    herbs = Herb.query.all()
-    for herb in herbs:
-        try:
-            relate_ids = json.loads(herb.relate_prescription)
-        except:
-            relate_ids = []
-        print(relate_ids)
-        original_len = len(relate_ids)
-        relate_ids = [id for id in relate_ids if id not in deleted_ids]
-
-        if len(relate_ids) != original_len:
-            herb.relate_prescription = json.dumps(relate_ids)
-            db.session.commit()
-
-    herbs = ChineseHerb.query.all()
-    for herb in herbs:
-        try:
-            relate_ids = json.loads(herb.relate_prescription)
-        except:
-            relate_ids = []
+    bump_version()
+    return jsonify({'message': 'Prescription group and related herb links deleted successfully!'})
 
-        original_len = len(relate_ids)
-        relate_ids = [id for id in relate_ids if id not in deleted_ids]
 
-        if len(relate_ids) != original_len:
-            herb.relate_prescription = json.dumps(relate_ids)
-            db.session.commit()
+@admin_bp.route('/rebuildRelations', methods=['POST'])
+def rebuild_relations():
+    counts = relations.rebuild_relations()
+    province_counts = provinces.rebuild_herb_provinces()
+    bump_version()
+    return jsonify({
+        'message': 'Relations rebuilt successfully!',
+        'links': counts,
+        'provinces': province_counts
+    })
+
+
+@admin_bp.route('/answerCache', methods=['GET'])
+def answer_cache_stats():
+    return jsonify(answer_cache.stats())
+
+
+@admin_bp.route('/answerCache', methods=['DELETE'])
+def purge_answer_cache():
+    # ?expired=1 only drops the answers older than the TTL
+    deleted = answer_cache.purge(expired_only=request.args.get('expired') == '1')
+    return jsonify({
+        'message': 'Answer cache purged successfully!',
+        'deleted': deleted,
+        **answer_cache.stats()
+    })
 
-    return jsonify({'message': 'Prescription group and related herb links deleted successfully!'})
+
+@admin_bp.route('/llmGateway', methods=['GET'])
+def llm_gateway_metrics():
+    # Queue depth and latencies of the worker that serves this request
+    return jsonify(gateway.metrics())
 
 
 @admin_bp.route('/deleteUser', methods=['DELETE'])
@@ -324,7 +318,8 @@ def get_all_user():
             'weight': user.weight,
             'age': user.age,
             'role': user.role,
-            'avatar': user.avatar
+            # The table shows small avatars; older uploads only have the original
+            'avatar': user.avatar_thumb or user.avatar
         })
     return jsonify({
         'code': 0,
@@ -363,6 +358,7 @@ def add_main_image():
     try:
         db.session.add(new_image)
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Image added successfully!'})
     except:
         return jsonify({'message': 'Something went wrong!'}), 500
@@ -376,6 +372,7 @@ def delete_main_image():
     try:
         db.session.delete(image)
         db.session.commit()
+        bump_version()
         return jsonify({'message': 'Image deleted successfully!'})
     except:
         return jsonify({'message': 'Something went wrong!'}), 500
@@ -391,27 +388,25 @@ def upload_banner():
     if file_en.filename == '' or file_zh.filename == '':
         return jsonify({'error': 'No file selected!'}), 400
     if file_en and allowed_file(file_en.filename) and file_zh and allowed_file(file_zh.filename):
-        filename_en = secure_filename(file_en.filename)
-        filename_zh = secure_filename(file_zh.filename)
-
-        # Add timestamps to prevent duplicate names
-        unique_filename_en = f"{int(time.time())}_{filename_en}"
-        unique_filename_zh = f"{int(time.time()) + 1}_{filename_zh}"
-        filepath_en = os.path.join(UPLOAD_FOLDER, unique_filename_en)
-        filepath_zh = os.path.join(UPLOAD_FOLDER, unique_filename_zh)
-        file_en.save(filepath_en)
-        file_zh.save(filepath_zh)
-
-        # Save the file path to the database
-        new_image = Image(imageUrl_en='/' + UPLOAD_FOLDER + '/' + unique_filename_en,
-                          imageUrl_zh='/' + UPLOAD_FOLDER + '/' + unique_filename_zh)
+        # Resized variants under content-hash names, which also dedupe identical uploads.
+        # Both are decoded before either is written: one invalid file leaves no files behind.
+        try:
+            variants_en, variants_zh = process_uploads([file_en, file_zh], 'banner')
+        except InvalidImage:
+            return jsonify({'error': 'The file is not a valid image'}), 400
+
+        # Save the file paths to the database, the full size as the plain URL
+        url_en = variants_en['full']['jpg']
+        new_image = Image(imageUrl_en=url_en, imageUrl_zh=variants_zh['full']['jpg'],
+                          variants_en=json.dumps(variants_en), variants_zh=json.dumps(variants_zh))
         db.session.add(new_image)
         db.session.commit()
+        bump_version()
 
         return jsonify({
             'message': 'File uploaded successfully',
-            'filename': unique_filename_en,
-            'path': filepath_en
+            'filename': os.path.basename(url_en),
+            'path': url_en.lstrip('/')
         }), 200
 
     return jsonify({'error': 'File type not allowed'}), 400
@@ -428,12 +423,13 @@ def change_user_avatar(userId):
         return jsonify({'error': 'No file selected!'}), 400
 
     if avatar and allowed_file(avatar.filename):
-        avatarName = secure_filename(avatar.filename)
-        uName = f"{int(time.time())}_{avatarName}"
         user = User.query.filter_by(id=userId).first()
-        filepath = os.path.join(UPLOAD_FOLDER, uName)
-        avatar.save(filepath)
-        user.avatar = '/' + UPLOAD_FOLDER + '/' + uName
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        try:
+            set_avatar(user, avatar)
+        except InvalidImage:
+            return jsonify({'error': 'The file is not a valid image'}), 400
         db.session.commit()
         return jsonify({
             'message': 'File uploaded successfully',
@@ -443,62 +439,84 @@ def change_user_avatar(userId):
 
 @admin_bp.route('/log', methods=['POST'])
 def show_log():
+    """
+    The last `lines` (default 1000) lines of both logs, read backwards from the end of the files.
+    Optional JSON body: lines, Acursor / Ecursor (the cursors of a previous response, for the
+    page before it), level (error log), status and path (access log).
+    """
+    data = request.get_json(silent=True) or {}
     try:
-        with open(GUNICORN_ACCESS_LOG, 'r') as f:
-            lines = f.readlines()[-1000:]
-            Alogs = ''.join(lines)
-
-        with open(GUNICORN_ERROR_LOG, 'r') as f:
-            lines = f.readlines()[-1000:]
-            Elogs = ''.join(lines)
+        limit = min(max(int(data.get('lines') or LOG_PAGE_SIZE), 1), LOG_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = LOG_PAGE_SIZE
+    access_filter = log_tail.line_filter(status=data.get('status'), path=data.get('path'))
+    error_filter = log_tail.line_filter(level=data.get('level'))
+    try:
+        access_lines, access_cursor = log_tail.tail(GUNICORN_ACCESS_LOG, limit, data.get('Acursor'), access_filter)
+        error_lines, error_cursor = log_tail.tail(GUNICORN_ERROR_LOG, limit, data.get('Ecursor'), error_filter)
 
         return jsonify({
             'status': 'success',
-            'Alogs': Alogs,
-            'Elogs': Elogs
+            'Alogs': ''.join(access_lines),
+            'Elogs': ''.join(error_lines),
+            'Acursor': access_cursor,
+            'Ecursor': error_cursor
         })
+    except log_tail.InvalidCursor as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Failed to read logs: {str(e)}'
         }), 500
 
+
+@admin_bp.route('/log/export', methods=['GET'])
+def export_log():
+    """A whole log as a streamed download: ?log=access|error, with the same filters as /log"""
+    log = request.args.get('log', 'access')
+    if log == 'access':
+        path = GUNICORN_ACCESS_LOG
+        keep = log_tail.line_filter(status=request.args.get('status'), path=request.args.get('path'))
+    elif log == 'error':
+        path = GUNICORN_ERROR_LOG
+        keep = log_tail.line_filter(level=request.args.get('level'))
+    else:
+        return jsonify({'error': 'log must be access or error'}), 400
+    if not os.path.exists(path):
+        return jsonify({'error': 'Log not found'}), 404
+    return Response(log_tail.export(path, keep), mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename={os.path.basename(path)}'
+    })
+
 @admin_bp.route('/analyze-logs', methods=['GET'])
 def analyze_logs():
-    # Log file path
-    log_file_path = "logs/gunicorn_access.log"
-
-    # Define regular expressions
-    url_pattern = re.compile(r'"([^"]+)"\s+\d+\s+\d+\s+"([^"]*)"')
-
-    # Create a dictionary that counts the number of visits to each URL
-    url_count = defaultdict(int)
-
-    # Open and read the log file
-    with open(log_file_path, "r") as log_file:
-        for line in log_file:
-            # Use regular expressions to find matching URLs
-            match = url_pattern.search(line)
-            verification = match.group(1)
-            url = match.group(2)
-            if match:
-                # Make sure it's the user's request
-                if verification.split(" ")[1].startswith("/api"):
-                    # Story mode needs to be handled separately
-                    if verification.split(" ")[1].startswith("/api/story"):
-                        if verification.split(" ")[1].startswith("/api/story/1"):
-                            url_count['http://csi6220-1-vm3.ucd.ie/story'] += 1
-                    # Herb Wiki needs to be handled separately
-                    elif verification.split(" ")[1].startswith("/api/herbs") or verification.split(" ")[1].startswith("/api/areas/herb"):
-                        url_count['http://csi6220-1-vm3.ucd.ie/herb'] += 1
-                    # Prescription Wiki needs to be handled separately
-                    elif verification.split(" ")[1].startswith("/api/prescriptions"):
-                        url_count['http://csi6220-1-vm3.ucd.ie/prescription'] += 1
-                    else:
-                        if url == 'http://csi6220-1-vm3.ucd.ie/zh/story/1':
-                            print(verification.split(" ")[1])
-                        if url != '-':
-                            if not url.startswith('http://csi6220-1-vm3.ucd.ie/zh/story'):
-                                url_count[url] += 1  # Count the number of visits to the URL
+    """
+    Visits counted from the access log, read from the hourly rollups kept by the log indexer.
+    ?kind=page (default, visits per page), route, status or hour; ?from=2025-05-01&to=2025-06-01
+    (UTC dates, `to` excluded). X-Log-Indexed: <indexed bytes>/<log size>, and X-Log-Partial: true
+    while the indexer has not caught up with the log yet.
+    """
+    kind = request.args.get('kind', 'page')
+    if kind not in log_indexer.KINDS and kind != 'hour':
+        return jsonify({'error': f'kind must be one of {", ".join(log_indexer.KINDS)}, hour'}), 400
+    try:
+        start, end = [datetime.strptime(request.args[name], '%Y-%m-%d') if request.args.get(name) else None
+                      for name in ('from', 'to')]
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    # Catch up with at most one chunk of new lines, after the pass already running if any (the
+    # background indexer of this or another worker). A bigger backlog is left to the background
+    # indexer: the rollups are served as they are, and the headers tell how far they go.
+    log_indexer.index_access_log(current_app._get_current_object(), max_bytes=log_indexer.CHUNK_SIZE,
+                                 wait=log_indexer.CATCH_UP_WAIT)
+    indexed, size = log_indexer.progress()
+    headers = {'X-Log-Indexed': f'{indexed}/{size}', 'X-Log-Partial': 'true' if indexed < size else 'false'}
+    if kind == 'hour':
+        return jsonify(log_indexer.hourly(start, end)), headers
     # Returns the statistical results in JSON format
-    return jsonify(dict(url_count))
\ No newline at end of file
+    return jsonify(log_indexer.totals(kind, start, end)), headers
@@ -8,7 +8,10 @@ import os
 from cozepy import COZE_CN_BASE_URL, Coze, TokenAuth, WebOAuthApp
 
 from flask import Blueprint, jsonify
-from service.coze_client import coze_client
+from service.coze_client import coze_client, NeedReauthorize
+from service.sse import sse_response
+from service.answer_cache import cached_chat, cached_stream
+from service.llm_gateway import Overloaded, gated, gated_stream, overload_response
 from config import config
 
 agent_bp = Blueprint('agent', __name__, url_prefix='/api/agent')
@@ -19,8 +22,25 @@ def chat_with_agent(message):
         return jsonify({'error': 'Message required'}), 400
     
     try:
-        response = coze_client.safe_chat(message)
+        response = cached_chat(gated('coze', coze_client.safe_chat), message)
         return jsonify({'message': response})
+    except Overloaded as e:
+        return overload_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# EventSource only does GET, so the message stays in the path like above
+@agent_bp.route('/stream/<string:message>', methods=['GET'])
+def stream_with_agent(message):
+    if not message:
+        return jsonify({'error': 'Message required'}), 400
+
+    try:
+        return sse_response(cached_stream(gated_stream('coze', coze_client.stream_chat), message))
+    except NeedReauthorize:
+        return '', 401
+    except Overloaded as e:
+        return overload_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,18 +1,16 @@
-import json
-
 from flask import Blueprint, jsonify, request
-from database import Herb, Prescription, ChinesePrescription, ChineseHerb
+from service.catalog import get_catalog
+from service.http_cache import conditional
+from service.search import search
 
 herb_bp = Blueprint('herb', __name__, url_prefix='/api/herbs')
 
 @herb_bp.route('/', methods=['GET'])
+@conditional
 def get_herbs():
     lang = request.args.get('lang', 'zh')
     result = []
-    if lang == 'en':
-        herbs = Herb.query.all()
-    else:
-        herbs = ChineseHerb.query.all()
+    herbs = get_catalog().lang(lang).herbs
     for herb in herbs:
         result.append({
             'id': herb.id,
@@ -28,10 +26,7 @@ def get_useful_herbs():
     print(lang)
 
     # Get a list of herbs
-    if lang == 'en':
-        herbs = Herb.query.limit(20).all()
-    else:
-        herbs = ChineseHerb.query.limit(20).all()
+    herbs = get_catalog().lang(lang).herbs[:20]
 
     result = []
     for herb in herbs:
@@ -44,13 +39,11 @@ def get_useful_herbs():
     return jsonify(result)
 
 @herb_bp.route('/<string:category>', methods=['GET'])
+@conditional
 def get_herbs_by_category(category):
     lang = request.args.get('lang', 'zh')
     result = []
-    if lang == 'en':
-        herbs = Herb.query.filter_by(category=category).all()
-    else:
-        herbs = ChineseHerb.query.filter_by(category=category).all()
+    herbs = [herb for herb in get_catalog().lang(lang).herbs if herb.category == category]
     if not herbs:
         return jsonify({'error': 'No herbs found with category {}'.format(category)})
     for herb in herbs:
@@ -62,13 +55,11 @@ def get_herbs_by_category(category):
     return jsonify(result)
 
 @herb_bp.route('/classification/<string:classification>', methods=['GET'])
+@conditional
 def get_herbs_by_classification(classification):
     lang = request.args.get('lang', 'zh')
     result = []
-    if lang == 'en':
-        herbs = Herb.query.filter_by(classification=classification).all()
-    else:
-        herbs = ChineseHerb.query.filter_by(classification=classification).all()
+    herbs = [herb for herb in get_catalog().lang(lang).herbs if herb.classification == classification]
     if not herbs:
         return jsonify({'error': 'No herbs found with category {}'.format(classification)})
     for herb in herbs:
@@ -80,28 +71,23 @@ def get_herbs_by_classification(classification):
     return jsonify(result)
 
 @herb_bp.route('/<int:id>', methods=['GET'])
+@conditional
 def get_herb(id):
     lang = request.args.get('lang', 'zh')
-    if lang == 'en':
-        herb = Herb.query.filter_by(id=id).first()
-    else:
-        herb = ChineseHerb.query.filter_by(id=id).first()
+    catalog = get_catalog()
+    view = catalog.lang(lang)
+    herb = view.herb(id)
     if not herb:
         return jsonify({'error': 'No prescription found'}), 404
 
-    relate_prescription_id = json.loads(herb.relate_prescription)
-    relate_prescription_name = []
-    for pid in relate_prescription_id:
-        if lang == 'en':
-            pre = Prescription.query.filter_by(id=pid).first()
-        else:
-            pre = ChinesePrescription.query.filter_by(id=pid).first()
-        relate_prescription_name.append(pre.name)
+    relate_prescription_id = [pid for pid in herb.relate_prescription if view.prescription(pid)]
+    relate_prescription_name = [view.prescription(pid).name for pid in relate_prescription_id]
+    cn_herb = catalog.zh.herb(herb.id)
 
     return jsonify({
         "id": herb.id,
         "name": herb.name,
-        'cnName': ChineseHerb.query.filter_by(id=herb.id).first().name,
+        'cnName': cn_herb.name if cn_herb else herb.name,
         "category": herb.category,
         "origin": herb.origin,
         "production_regions": herb.production_regions,
@@ -114,32 +100,18 @@ def get_herb(id):
     })
 
 @herb_bp.route('/categories', methods=['GET'])
+@conditional
 def get_category():
     lang = request.args.get('lang', 'zh')
-    if lang == 'en':
-        herbs = Herb.query.all()
-    else:
-        herbs = ChineseHerb.query.all()
-    categories = []
-    for herb in herbs:
-        if herb.category not in categories and len(herb.category) > 1:
-            categories.append(herb.category)
-    result = json.dumps(categories)
-    return result
+    categories = list(get_catalog().lang(lang).categories)
+    return jsonify(categories)
 
 @herb_bp.route('/classifications', methods=['GET'])
+@conditional
 def get_classification():
     lang = request.args.get('lang', 'zh')
-    if lang == 'en':
-        herbs = Herb.query.all()
-    else:
-        herbs = ChineseHerb.query.all()
-    classifications = []
-    for herb in herbs:
-        if herb.classification not in classifications and len(herb.classification) > 1:
-            classifications.append(herb.classification)
-    result = json.dumps(classifications)
-    return result
+    classifications = list(get_catalog().lang(lang).classifications)
+    return jsonify(classifications)
 
 @herb_bp.route('/search', methods=['GET'])
 def get_herb_by_name():
@@ -147,25 +119,12 @@ def get_herb_by_name():
     name = request.args.get("name", "").strip()
     if not name:
         return jsonify({'error': 'No name provided'}), 400
+    # Every match unless the client pages (?page=, ?pageSize=)
+    page = request.args.get('page', type=int)
+    page_size = request.args.get('pageSize', type=int)
     try:
-        EN_herbs = Herb.query.filter(Herb.name.ilike(f'%{name}%')).all()
-        CN_herbs = ChineseHerb.query.filter(ChineseHerb.name.ilike(f'%{name}%')).all()
-        herbIds = []
-        if not EN_herbs:
-            for herb in CN_herbs:
-                herbIds.append(herb.id)
-        else:
-            for herb in EN_herbs:
-                herbIds.append(herb.id)
-
-        result = []
-        for hid in herbIds:
-            if lang == 'en':
-                herb = Herb.query.filter_by(id=hid).first()
-            else:
-                herb = ChineseHerb.query.filter_by(id=hid).first()
-            result.append({"id": herb.id, "name": herb.name, "image": herb.image})
-
+        rows = search('herb', name, lang, page, page_size)
+        result = [{"id": row['id'], "name": row['name'], "image": row['image']} for row in rows]
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -180,13 +139,12 @@ def get_herb_names_batch():
             return jsonify({'error': 'No ids provided'}), 400
 
         result = []
-        Model = Herb if lang == 'en' else ChineseHerb
-        herbs = Model.query.filter(Model.id.in_(ids)).all()
-        herb_dict = {herb.id: herb.name for herb in herbs}
+        view = get_catalog().lang(lang)
         # Ensure the order matches the request
         for hid in ids:
-            if hid in herb_dict:
-                result.append({'id': hid, 'name': herb_dict[hid]})
+            herb = view.herb(hid)
+            if herb:
+                result.append({'id': hid, 'name': herb.name})
         return jsonify(result)
     except Exception as e:
         print(f"Failed to batch get herb names: {e}")
@@ -1,24 +1,34 @@
 from flask import Blueprint, jsonify, request
 from database import Image
+from service.http_cache import conditional
+from service.images import banner_variants, srcset
 
 image_bp = Blueprint('image', __name__, url_prefix='/api/mainImage')
 
 @image_bp.route('/banner', methods=['GET'])
+@conditional
 def getAllBenners():
     lang = request.args.get('lang', 'zh')
     images = Image.query.all()
     result = []
     for image in images:
         if lang == 'zh':
-            result.append({
+            item = {
                 "imageUrl": image.imageUrl_zh,
                 "id": image.id,
-            })
+            }
+            variants = banner_variants(image.variants_zh)
         else:
-            result.append({
+            item = {
                 "imageUrl": image.imageUrl_en,
                 "id": image.id,
-            })
+            }
+            variants = banner_variants(image.variants_en)
+        if variants:
+            # Responsive sizes: <img :src="imageUrl" :srcset="srcset" sizes="100vw">
+            item["srcset"] = srcset(variants)
+            item["variants"] = variants
+        result.append(item)
     return jsonify({
         "code": 0,
         "data": result,
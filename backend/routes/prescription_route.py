@@ -1,16 +1,16 @@
 from flask import Blueprint, jsonify, request
-from database import Prescription, ChinesePrescription, Herb, ChineseHerb
+from service.catalog import get_catalog
+from service.http_cache import conditional
+from service.search import search
 
 prescription_bp = Blueprint('prescription', __name__, url_prefix='/api/prescriptions')
 
 @prescription_bp.route('', methods=['GET'])
+@conditional
 def get_prescriptions():
     lang = request.args.get('lang', 'zh')
     result = []
-    if lang == 'en':
-        prescriptions = Prescription.query.all()
-    else:
-        prescriptions = ChinesePrescription.query.all()
+    prescriptions = get_catalog().lang(lang).prescriptions
     for p in prescriptions:
         result.append({
             "id": p.id,
@@ -19,35 +19,23 @@ def get_prescriptions():
     return jsonify(result)
 
 @prescription_bp.route('/<int:id>', methods=['GET'])
+@conditional
 def get_prescription(id):
     lang = request.args.get('lang', 'zh')
-    if lang == 'en':
-        prescription = Prescription.query.filter_by(id=id).first()
-    else:
-        prescription = ChinesePrescription.query.filter_by(id=id).first()
+    catalog = get_catalog()
+    prescription = catalog.lang(lang).prescription(id)
     if not prescription:
         return jsonify({'error': 'No prescription found'}), 404
-    constitutes_name = prescription.constitute
-    constitutes_name_list = constitutes_name.split('; ')
-    constitutes_id = []
-    for constitute_name in constitutes_name_list:
-        if lang == 'en':
-            herb = Herb.query.filter_by(name=constitute_name).first()
-        else:
-            herb = ChineseHerb.query.filter_by(name=constitute_name).first()
-        try:
-            constitutes_id.append(herb.id)
-        except:
-            constitutes_id.append(-1)
+    cn_prescription = catalog.zh.prescription(prescription.id)
 
     return jsonify({
         "id": prescription.id,
         "name": prescription.name,
-        "cnName": ChinesePrescription.query.filter_by(id=prescription.id).first().name,
+        "cnName": cn_prescription.name if cn_prescription else prescription.name,
         "constitute": prescription.constitute,
         "action": prescription.action,
         "indication": prescription.indication,
-        "constituteId": constitutes_id,
+        "constituteId": list(prescription.constitute_ids),
     })
 
 @prescription_bp.route('/search', methods=['GET'])
@@ -58,25 +46,12 @@ def get_prescription_by_name():
     if not name:
         return jsonify({'error': 'No name provided'}), 400
 
+    # Every match unless the client pages (?page=, ?pageSize=)
+    page = request.args.get('page', type=int)
+    page_size = request.args.get('pageSize', type=int)
     try:
-        EN_Prescription = Prescription.query.filter(Prescription.name.ilike(f'%{name}%')).all()
-        CN_Prescription = ChinesePrescription.query.filter(ChinesePrescription.name.ilike(f'%{name}%')).all()
-        prescriptionIds = []
-        if not EN_Prescription:
-            for prescription in CN_Prescription:
-                prescriptionIds.append(prescription.id)
-        else:
-            for prescription in EN_Prescription:
-                prescriptionIds.append(prescription.id)
-
-        result = []
-        for pid in prescriptionIds:
-            if lang == 'en':
-                prescription = Prescription.query.filter_by(id=pid).first()
-            else:
-                prescription = ChinesePrescription.query.filter_by(id=pid).first()
-            result.append({"id": prescription.id, "name": prescription.name})
-
+        rows = search('prescription', name, lang, page, page_size)
+        result = [{"id": row['id'], "name": row['name']} for row in rows]
         return jsonify(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -1,58 +1,46 @@
-from flask import Blueprint, jsonify
-from database import StoryMode
-import json
+from flask import Blueprint, Response, jsonify
+from service.http_cache import conditional
+from service.story import get_story_graph
 
 story_bp = Blueprint('story_bp', __name__, url_prefix='/api/story')
 
-def to_dict(story):
-    return {
-        "story_number": story.story_number,
-        "id": story.id,
-        "label": story.scene,
-        "speaker": story.character,
-        "dialog": story.text,
-        "choices": json.loads(story.option or "[]"),
-        "next_id": json.loads(story.next or "[]"),
-        "background": story.bg_image,
-        "character_image": json.loads(story.character_image or "[]"),
-        "audio": story.audio_file,
-        "speaker_en": story.character_en,
-        "dialog_en": story.text_en,
-        "choices_en": json.loads(story.option_en or "[]"),
-
-    }
-
 @story_bp.route('/begin', methods=['GET'])
+@conditional
 def beginStory():
-    story = StoryMode.query.first()
-    return jsonify(to_dict(story))
+    return jsonify(get_story_graph().first())
+
+
+# The whole story in one response: every node with its next ids, and the asset manifest, so the
+# client can prefetch the images and audio and play the story without further requests
+@story_bp.route('/<int:story_number>/bundle', methods=['GET'])
+@conditional
+def get_story_bundle(story_number):
+    bundle = get_story_graph().bundles.get(story_number)
+    if bundle is None:
+        return jsonify({"message": "Story not found"}), 404
+    return Response(bundle, mimetype='application/json')
 
 
 # Get a specific plot node
 @story_bp.route('/<int:story_id>', methods=['GET'])
+@conditional
 def get_story(story_id):
-    story = StoryMode.query.filter_by(id=story_id).first()
+    story = get_story_graph().find(story_id)
     if story:
-        print(story)
-        print(story.id)
-        return jsonify(to_dict(story))
+        return jsonify(story)
     else:
         return jsonify({"message": "Story not found"}), 404
 
 
 # Get the next story node
 @story_bp.route('/next/<int:story_id>', methods=['GET'])
+@conditional
 def get_next_story(story_id):
+    graph = get_story_graph()
     # Get the current episode
-    current_story = StoryMode.query.filter_by(id=story_id).first()
+    current_story = graph.find(story_id)
     if current_story:
-        next_id = current_story.next
-        next_story_ids = eval(next_id)  # Get the IDs of the two possible next options
-        stories = []
-        for next_story_id in next_story_ids:
-            next_story = StoryMode.query.filter_by(id=next_story_id).first()
-            if next_story:
-                stories.append(to_dict(next_story))
-        return jsonify(stories)
+        # The nodes of the possible next options
+        return jsonify(graph.successors(current_story))
     else:
         return jsonify({"message": "Story not found"}), 404
@@ -1,14 +1,14 @@
 import datetime
 import os
-import time
 
 from flask import Blueprint, jsonify, request
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
 
 from database import db, User, HealthySuggestion
-from config import client
+from service.health_suggestion import suggestion_for
+from service.images import InvalidImage, set_avatar
+from service.llm_gateway import Overloaded, overload_response
 
 user_bp = Blueprint('user', __name__, url_prefix='/api')
 
@@ -127,44 +127,12 @@ def health_suggestion():
         if abs(nowTime - oldTime) < datetime.timedelta(hours=4):
             ask = False
     if ask:
-        month = data.get('month')
-        age = data.get('age')
-        weight = data.get('weight')
-        height = data.get('height')
-
-        dic = {
-            1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June", 7: "July", 8: "August",
-            9: "September", 10: "October", 11: "November", 12: "December",
-        }
-
-        messages_en = [{
-            "role": "assistant",
-            "content": f"Suppose you are a Chinese medicine health expert, I have a user here, age is {age} years "
-                       f"old, height is {height}cm, weight is {weight}kg, the current is {dic.get(month)}, please give "
-                       f"conditioning suggestions, note, just reply to the suggestion, the number of words does not "
-                       f"exceed 150 words, in english. Attention, Some user information may be missing, so don't "
-                       f"worry about it, just respond based on what you already have"
-        }]
-
-        messages_zh = [{
-            "role": "assistant",
-            "content": f"假设你是一个中药养生专家，我这里有个用户，年龄{age}岁，身高{height}cm，体重{weight}kg，当前是{month}月，"
-                       f"请给出调理建议，注意，只需回复建议就可以，字数不超过150字，有些用户信息可能是缺失的，那就不用管，只需要根据已有"
-                       f"信息做出回应就可以"
-        }]
-
-        response_en = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages_en
-        )
-
-        response_zh = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages_zh
-        )
-
-        response_message_en = response_en.choices[0].message.content
-        response_message_zh = response_zh.choices[0].message.content
+        # Profiles in the same age / height / weight bands and month share one suggestion
+        try:
+            response_message_en, response_message_zh = suggestion_for(
+                data.get('age'), data.get('height'), data.get('weight'), data.get('month'))
+        except Overloaded as e:
+            return overload_response(e)
 
         if hs:
             hs.datetime = nowTime
@@ -205,16 +173,17 @@ def user_avatar():
         return jsonify({'error': 'No file selected!'}), 400
 
     if avatar and allowed_file(avatar.filename):
-        avatarName = secure_filename(avatar.filename)
-        uName = f"{int(time.time())}_{avatarName}"
-        filepath = os.path.join(UPLOAD_FOLDER, uName)
-        avatar.save(filepath)
         username = get_jwt_identity()
         user = User.query.filter_by(username=username).first()
-        user.avatar = '/' + UPLOAD_FOLDER + '/' + uName
+        try:
+            # Stored as resized variants under content-hash names
+            set_avatar(user, avatar)
+        except InvalidImage:
+            return jsonify({'error': 'The file is not a valid image'}), 400
         db.session.commit()
         return jsonify({
             'message': 'File uploaded successfully',
+            'avatar': user.avatar,
         }), 200
 
     return jsonify({'error': 'File type not allowed'}), 400
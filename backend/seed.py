@@ -0,0 +1,228 @@
+"""
+Seeding stage: fills an empty database from the bundled CSV files.
+
+Runs once in the gunicorn master before the workers fork (see gunicorn.conf.py), or by hand:
+
+    python seed.py
+
+Every table is loaded with bulk inserts in a single transaction, and a file lock makes sure
+that only one process seeds at a time. Tables that already hold data are skipped, so the
+workers importing app.py only pay for a few SELECT 1 checks.
+"""
+
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from database import db, init_db, init_search, populate_prescription_herbs, User, Area, \
+    Image, Prescription, ChinesePrescription, Herb, ChineseHerb, PrescriptionHerb, ChinesePrescriptionHerb, \
+    HerbProvince, ChineseHerbProvince, StoryMode
+from service.catalog import VERSION_FILE, bump_version
+from service.name_matcher import NameMatcher
+from service.provinces import rebuild_herb_provinces
+from service.relations import constituent_index, herb_links
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED_LOCK = os.path.join(BASE_DIR, 'seed.lock')
+CHUNK_SIZE = 1000
+
+
+@contextmanager
+def seed_lock():
+    with open(SEED_LOCK, 'w') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_csv(filename):
+    """Stream the rows of a bundled CSV file"""
+    with open(os.path.join(BASE_DIR, filename), mode='r', newline='', encoding='utf-8') as file:
+        yield from csv.reader(file)
+
+
+def bulk_insert(model, rows):
+    """executemany in chunks, committed once as a single transaction. Returns the row count."""
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        db.session.execute(model.__table__.insert(), chunk)
+        count += len(chunk)
+    db.session.commit()
+    return count
+
+
+def prescription_rows(filename):
+    for row in read_csv(filename):
+        yield {'name': row[0], 'constitute': row[1], 'action': row[2], 'indication': row[3],
+               'constituteNumber': len(row[1].split(';'))}
+
+
+def herb_relations(prescription_model, fuzzy):
+    """Build the constituent name index once and return name -> sorted related prescription ids"""
+    index = constituent_index(db.session.query(prescription_model.id, prescription_model.constitute))
+    # The fuzzy pass only scores the candidate constituent names of the n-gram index
+    matcher = NameMatcher(index) if fuzzy else None
+
+    def relations(name):
+        return sorted(herb_links(index, name, matcher))
+    return relations
+
+
+def herb_rows(filename, relations):
+    for row in read_csv(filename):
+        yield {'name': row[0], 'category': row[1], 'origin': row[2], 'production_regions': row[3],
+               'properties': row[4], 'functions': row[5], 'image': row[6],
+               'relate_prescription': json.dumps(relations(row[0])), 'classification': row[7]}
+
+
+# Quotation mark repair function
+def fix_json_array(raw):
+    if not raw or str(raw).strip() in ("", "[]"):
+        return []
+    try:
+        s = str(raw).strip()
+        if s.startswith('"') and s.endswith('"'):
+            s = s[1:-1]
+        s = s.replace('""', '"')
+        return json.loads(s)
+    except Exception as e:
+        print(f"Field repair failed: {raw} → {e}")
+        return []
+
+
+def story_rows(filename):
+    for row in read_csv(filename):
+        try:
+            image_urls = [
+                f"/static/Story/character_image/{name.strip()}"
+                for name in fix_json_array(row[8].strip()) if name.strip()
+            ]
+            yield {
+                'story_number': int(row[0]),
+                'id': int(row[1]),
+                'scene': row[2],
+                'character': row[3],
+                'text': row[4],
+                'option': json.dumps(fix_json_array(row[5])),
+                'next': json.dumps(fix_json_array(row[6])),
+                'bg_image': f"/static/Story/{row[7]}",
+                'character_image': json.dumps(image_urls),
+                'audio_file': row[9],
+                'character_en': row[10],
+                'text_en': row[11],
+                'option_en': json.dumps(fix_json_array(row[12])),
+            }
+        except Exception:
+            print(f"Failed to insert a record")
+
+
+def default_users():
+    avatar = '/static/assets/BlankAvatar-Cl_LpKw_.png'
+    password = '$2b$12$FeqB4xc26Krjgis.11iVy./elyAnsTHsXmmAFK.QRDlU9JsxzVDfq'
+    return [
+        {'username': 'Admin', 'password': password, 'role': 'admin', 'avatar': avatar},
+        {'username': 'Client', 'password': password, 'role': 'client', 'avatar': avatar},
+    ]
+
+
+def default_areas():
+    return [
+        {'type': 'polygon', 'coordinates': json.dumps([[39.8704, 116.4716], [39.8781, 116.4715],
+                                                       [39.8781, 116.4772], [39.8749, 116.4797],
+                                                       [39.8745, 116.4831], [39.8728, 116.4828],
+                                                       [39.8702, 116.4797]])},
+    ]
+
+
+def default_images():
+    urls = [
+        'https://pic4.zhimg.com/v2-000f1c1ae3e7ae215e216912aa81e647_720w.jpg?source=172ae18b',
+        'https://bpic.588ku.com/back_list_pic/20/08/04/42586bb0e728cda777e35e774986df52.jpg!/fh/300/quality/90/unsharp/true/compress/true',
+        'https://oss.cyzone.cn/2022/0104/f39b42dfe92daac729eb9d2d28ec6d48.jpg',
+    ]
+    return [{'imageUrl_en': url, 'imageUrl_zh': url} for url in urls]
+
+
+def seed_tables():
+    # (model, rows factory). Order matters: herbs link to the prescriptions seeded before them.
+    return [
+        (User, default_users),
+        (Area, default_areas),
+        (Image, default_images),
+        (Prescription, lambda: prescription_rows('herbs_data.csv')),
+        (ChinesePrescription, lambda: prescription_rows('chinese_herbs_data.csv')),
+        (Herb, lambda: herb_rows('Updated_Constitutes_Data.csv', herb_relations(Prescription, False))),
+        (ChineseHerb, lambda: herb_rows('chinese_constitutes_data_updated.csv',
+                                        herb_relations(ChinesePrescription, True))),
+        (StoryMode, lambda: story_rows('visual_novel_huoxiang_tree converted_file_utf8.csv')),
+    ]
+
+
+def seed_database(app):
+    """Seed every empty table and print how long each one took"""
+    with app.app_context(), seed_lock():
+        started = time.perf_counter()
+        seeded = False
+        for model, rows in seed_tables():
+            if db.session.query(model).first():
+                continue
+            table_started = time.perf_counter()
+            count = bulk_insert(model, rows())
+            seeded = True
+            print(f"Seeded {model.__tablename__}: {count} rows in {time.perf_counter() - table_started:.3f}s")
+
+        for herb_model, prescription_model, link_model in ((Herb, Prescription, PrescriptionHerb),
+                                                           (ChineseHerb, ChinesePrescription,
+                                                            ChinesePrescriptionHerb)):
+            if not db.session.query(link_model).first() and db.session.query(prescription_model).first():
+                table_started = time.perf_counter()
+                populate_prescription_herbs(herb_model, prescription_model, link_model)
+                seeded = True
+                print(f"Seeded {link_model.__tablename__} in {time.perf_counter() - table_started:.3f}s")
+
+        if not (db.session.query(HerbProvince).first() or db.session.query(ChineseHerbProvince).first()) \
+                and db.session.query(Herb).first():
+            table_started = time.perf_counter()
+            counts = rebuild_herb_provinces()
+            seeded = True
+            print(f"Seeded herb provinces: {counts} in {time.perf_counter() - table_started:.3f}s")
+
+        table_started = time.perf_counter()
+        if init_search():
+            seeded = True
+            print(f"Seeded search index in {time.perf_counter() - table_started:.3f}s")
+        if seeded:
+            print(f"Database seeding finished in {time.perf_counter() - started:.3f}s")
+        # The version is also the ETag / Last-Modified source of the read endpoints
+        if seeded or not VERSION_FILE.exists():
+            bump_version()
+
+
+def main():
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.config.from_pyfile(os.path.join(BASE_DIR, 'config.py'))
+    db.init_app(app)
+    init_db(app)
+    seed_database(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+# service/answer_cache.py
+
+import hashlib
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert
+
+from database import db, AnswerCache, Counter
+
+try:
+    # Optional: folds traditional Chinese into simplified, so both spellings share an answer
+    from opencc import OpenCC
+    to_simplified = OpenCC('t2s').convert
+except ImportError:
+    to_simplified = None
+
+MAX_ENTRIES = 2000
+TTL = timedelta(days=7)
+NO_ANSWER = "No answer received"  # safe_chat's reply when the bot said nothing, never cached
+# Hits, recency and the hit/miss counters are kept in memory and written at most this often
+# (and before every store), so that a cached answer costs a read and no write
+FLUSH_INTERVAL = 30  # seconds
+
+_pending_hits = {}  # cache key -> hits not written yet
+_pending_counts = {}  # counter name -> increments not written yet
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def normalize(question):
+    """
+    Case, width, whitespace and punctuation folded: "What is Ginseng?" == "what is  ginseng".
+    Numbers stay apart: "1.5 g" -> "1 5g", not "15g".
+    """
+    text = unicodedata.normalize('NFKC', question).casefold()
+    if to_simplified:
+        text = to_simplified(text)
+    # Drop punctuation (P*), separators (Z*) and control characters (C*), except that a
+    # dropped run between two digits is kept as one space
+    result = []
+    gap = False
+    for ch in text:
+        if unicodedata.category(ch)[0] in 'PZC':
+            gap = True
+            continue
+        if gap and ch.isdigit() and result and result[-1].isdigit():
+            result.append(' ')
+        gap = False
+        result.append(ch)
+    return ''.join(result)
+
+
+def cache_key(question):
+    return hashlib.sha1(normalize(question).encode('utf-8')).hexdigest()
+
+
+def count(name, value=1):
+    stmt = insert(Counter).values(name=name, value=value)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[Counter.name],
+                                                  set_={'value': Counter.value + value}))
+
+
+def flush(force=False):
+    """Write the pending hits and counters, if FLUSH_INTERVAL has passed. The caller commits."""
+    global _last_flush
+    with _pending_lock:
+        if not force and time.monotonic() - _last_flush < FLUSH_INTERVAL:
+            return False
+        hits = dict(_pending_hits)
+        counts = dict(_pending_counts)
+        _pending_hits.clear()
+        _pending_counts.clear()
+        _last_flush = time.monotonic()
+    now = datetime.utcnow()
+    for key, value in hits.items():
+        # The entry may have been evicted or replaced meanwhile: then nothing is updated
+        AnswerCache.query.filter_by(key=key).update(
+            {'hits': AnswerCache.hits + value, 'last_used': now}, synchronize_session=False)
+    for name, value in counts.items():
+        count(name, value)
+    return bool(hits or counts)
+
+
+def lookup(question):
+    """The cached answer, or None. Counts the hit or the miss."""
+    key = cache_key(question)
+    entry = db.session.get(AnswerCache, key)
+    answer = None
+    with _pending_lock:
+        if entry and datetime.utcnow() - entry.created_at < TTL:
+            answer = entry.answer
+            _pending_hits[key] = _pending_hits.get(key, 0) + 1
+            name = 'answer_cache.hit'
+        else:
+            name = 'answer_cache.miss'
+        _pending_counts[name] = _pending_counts.get(name, 0) + 1
+    if flush():
+        db.session.commit()
+    return answer
+
+
+def store(question, answer):
+    """Keep an answer, then evict the least recently used entries beyond MAX_ENTRIES"""
+    if not answer or answer == NO_ANSWER:
+        return
+    # Recency first, so that the eviction below sees the entries recently read
+    flush(force=True)
+    now = datetime.utcnow()
+    stmt = insert(AnswerCache).values(key=cache_key(question), question=question, answer=answer,
+                                      hits=0, created_at=now, last_used=now)
+    # Two workers may have asked the same question at once: the last answer wins
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[AnswerCache.key], set_={
+        'question': stmt.excluded.question,
+        'answer': stmt.excluded.answer,
+        'hits': 0,
+        'created_at': stmt.excluded.created_at,
+        'last_used': stmt.excluded.last_used,
+    }))
+    keep = db.session.query(AnswerCache.key).order_by(AnswerCache.last_used.desc()).limit(MAX_ENTRIES)
+    AnswerCache.query.filter(AnswerCache.key.not_in(keep.scalar_subquery())) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+
+
+def cached_chat(ask, question):
+    """ask(question) (CozeClient.safe_chat) behind the cache"""
+    answer = lookup(question)
+    if answer is None:
+        answer = ask(question)
+        store(question, answer)
+    return answer
+
+
+def cached_stream(stream, question):
+    """
+    stream(question) (CozeClient.stream_chat) behind the cache: a hit is sent as one chunk,
+    a miss is relayed as it comes and stored once it has been streamed in full.
+    """
+    answer = lookup(question)
+    if answer is not None:
+        yield answer
+        return
+    # The response body is written after the request context is gone
+    app = current_app._get_current_object()
+    chunks = stream(question)
+    parts = []
+    try:
+        for chunk in chunks:
+            if chunk is not None:
+                parts.append(chunk)
+            yield chunk
+    finally:
+        chunks.close()
+    with app.app_context():
+        store(question, ''.join(parts))
+
+
+def stats():
+    # Only this worker's pending counts: the other workers write theirs within FLUSH_INTERVAL
+    if flush(force=True):
+        db.session.commit()
+    counters = {c.name: c.value for c in Counter.query.filter(Counter.name.like('answer_cache.%'))}
+    return {
+        'entries': AnswerCache.query.count(),
+        'maxEntries': MAX_ENTRIES,
+        'ttlSeconds': int(TTL.total_seconds()),
+        'hits': counters.get('answer_cache.hit', 0),
+        'misses': counters.get('answer_cache.miss', 0),
+    }
+
+
+def purge(expired_only=False):
+    """Delete the cached answers (only the expired ones if asked). Returns how many went."""
+    query = AnswerCache.query
+    if expired_only:
+        query = query.filter(AnswerCache.created_at < datetime.utcnow() - TTL)
+    deleted = query.delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
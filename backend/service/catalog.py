@@ -0,0 +1,231 @@
+# service/catalog.py
+
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import cached_property
+from pathlib import Path
+
+from database import Herb, ChineseHerb, Prescription, ChinesePrescription, PrescriptionHerb, \
+    ChinesePrescriptionHerb, HerbProvince, ChineseHerbProvince, split_constitute
+from service.name_matcher import NameMatcher
+
+# Every gunicorn worker keeps its own snapshot. Admin writes rewrite this file and
+# the workers notice the new version on their next read and reload lazily.
+VERSION_FILE = Path(__file__).parent.parent / "catalog.version"
+
+HerbRow = namedtuple('HerbRow', [
+    'id', 'name', 'category', 'origin', 'production_regions', 'properties', 'functions', 'image',
+    'relate_prescription', 'classification', 'provinces',
+])
+
+PrescriptionRow = namedtuple('PrescriptionRow', [
+    'id', 'name', 'constitute', 'action', 'indication', 'constituteNumber',
+    'constitute_names', 'constitute_ids',
+])
+
+
+class CatalogView:
+    """Herbs and prescriptions of one language, with the lookup maps the routes need"""
+
+    def __init__(self, herb_model, prescription_model, link_model, province_model):
+        # One query for all links: herb -> prescriptions, and prescription -> herb by position
+        relate = {}
+        constituents = {}
+        for link in link_model.query.order_by(link_model.prescription_id, link_model.herb_id).all():
+            relate.setdefault(link.herb_id, []).append(link.prescription_id)
+            if link.position is not None:
+                # Herbs sharing a name link to the same position, the lowest id is shown
+                constituents.setdefault(link.prescription_id, {}).setdefault(link.position, link.herb_id)
+
+        # Provinces parsed from production_regions, in the order the text names them
+        provinces = {}
+        for link in province_model.query.order_by(province_model.herb_id, province_model.position).all():
+            provinces.setdefault(link.herb_id, []).append(link.province_code)
+
+        self.herbs = tuple(
+            HerbRow(h.id, h.name, h.category, h.origin, h.production_regions, h.properties, h.functions,
+                    h.image, tuple(relate.get(h.id, ())), h.classification, tuple(provinces.get(h.id, ())))
+            for h in herb_model.query.order_by(herb_model.id).all()
+        )
+        self.herbs_by_id = {h.id: h for h in self.herbs}
+        self.herb_ids_by_name = {}
+        for h in self.herbs:
+            # Same as filter_by(name=...).first(): the lowest id wins
+            self.herb_ids_by_name.setdefault(h.name, h.id)
+
+        # Province code -> herbs grown there, the reverse of HerbRow.provinces
+        self.herb_ids_by_province = {}
+        for h in self.herbs:
+            for code in h.provinces:
+                self.herb_ids_by_province.setdefault(code, []).append(h.id)
+
+        self.categories = self._distinct(h.category for h in self.herbs)
+        self.classifications = self._distinct(h.classification for h in self.herbs)
+
+        prescriptions = []
+        for p in prescription_model.query.order_by(prescription_model.id).all():
+            names = tuple(split_constitute(p.constitute))
+            positions = constituents.get(p.id, {})
+            # A herb listed twice only has a link at its first position
+            ids_by_name = {}
+            for position, name in enumerate(names):
+                if position in positions:
+                    ids_by_name.setdefault(name.lower(), positions[position])
+            ids = tuple(positions.get(position, ids_by_name.get(name.lower(), -1))
+                        for position, name in enumerate(names))
+            prescriptions.append(PrescriptionRow(p.id, p.name, p.constitute, p.action, p.indication,
+                                                 p.constituteNumber, names, ids))
+        self.prescriptions = tuple(prescriptions)
+        self.prescriptions_by_id = {p.id: p for p in self.prescriptions}
+        self.prescription_ids_by_name = {}
+        for p in self.prescriptions:
+            self.prescription_ids_by_name.setdefault(p.name, p.id)
+
+        # Constituent id set of every prescription, and the inverted herb -> prescriptions index.
+        # The index holds every link, including the fuzzy ones of Chinese herbs which are not
+        # exact constituent names.
+        self.constitute_sets = {p.id: frozenset(i for i in p.constitute_ids if i != -1) for p in self.prescriptions}
+        self.prescription_ids_by_herb = {
+            hid: tuple(sorted(pid for pid in pids if pid in self.prescriptions_by_id))
+            for hid, pids in relate.items()
+        }
+
+    # Indexes used when an admin edit relinks herbs and prescriptions, built on first use
+
+    @cached_property
+    def constituent_index(self):
+        """Lower-cased constituent name -> {prescription id: position}"""
+        index = {}
+        for p in self.prescriptions:
+            for position, name in enumerate(p.constitute_names):
+                index.setdefault(name.lower(), {}).setdefault(p.id, position)
+        return index
+
+    @cached_property
+    def constituent_matcher(self):
+        return NameMatcher(self.constituent_index)
+
+    @cached_property
+    def herb_ids_by_lower_name(self):
+        """Lower-cased herb name -> ids of every herb with that name"""
+        index = {}
+        for h in self.herbs:
+            index.setdefault(h.name.strip().lower(), []).append(h.id)
+        return index
+
+    @cached_property
+    def herb_matcher(self):
+        return NameMatcher(self.herb_ids_by_lower_name)
+
+    @cached_property
+    def herb_ids_by_category(self):
+        """Category -> herb ids, where the herb image quiz picks its distractors"""
+        index = {}
+        for h in self.herbs:
+            index.setdefault(h.category, []).append(h.id)
+        return index
+
+    @cached_property
+    def question_decks(self):
+        """
+        Prescription quiz decks by difficulty ('1', '2', '3'): the prescriptions sorted by
+        number of constituents and cut in thirds, keeping only those whose every constituent
+        is a known herb, so that each question can be answered
+        """
+        ranked = sorted(self.prescriptions, key=lambda p: p.constituteNumber)
+        third = len(ranked) // 3
+        buckets = (ranked[:third], ranked[third:2 * third], ranked[2 * third:])
+        return {
+            str(level): tuple(p.id for p in bucket if p.constitute_ids and -1 not in p.constitute_ids)
+            for level, bucket in enumerate(buckets, start=1)
+        }
+
+    @staticmethod
+    def _distinct(values):
+        result = []
+        for value in values:
+            if value and len(value) > 1 and value not in result:
+                result.append(value)
+        return tuple(result)
+
+    def herb(self, herb_id):
+        return self.herbs_by_id.get(herb_id)
+
+    def prescription(self, prescription_id):
+        return self.prescriptions_by_id.get(prescription_id)
+
+    def herb_id(self, name):
+        return self.herb_ids_by_name.get(name, -1)
+
+    def match_prescriptions(self, herb_ids, limit=5):
+        """
+        Match a selection of herbs against every prescription using the inverted index.
+        Returns (exact, ranked): the prescriptions made of exactly these herbs, and the top
+        `limit` prescriptions sharing at least one herb, best Jaccard overlap first.
+        """
+        selected = frozenset(hid for hid in herb_ids if hid in self.herbs_by_id)
+        hits = {}
+        for hid in selected:
+            for pid in self.prescription_ids_by_herb.get(hid, ()):
+                hits[pid] = hits.get(pid, 0) + 1
+
+        exact = [self.prescriptions_by_id[pid] for pid in sorted(hits)
+                 if self.constitute_sets[pid] == selected
+                 and len(self.prescriptions_by_id[pid].constitute_names) == len(selected)]
+
+        def score(pid):
+            # Fuzzy links can count a herb that is not among the exact constituent names
+            size = max(len(self.prescriptions_by_id[pid].constitute_names), hits[pid])
+            return hits[pid] / (len(selected) + size - hits[pid])
+
+        ranked = sorted(hits, key=lambda pid: (-score(pid), -hits[pid], pid))[:limit]
+        return exact, [self.prescriptions_by_id[pid] for pid in ranked]
+
+
+class Catalog:
+    """Read-only snapshot of the bilingual catalog, tagged with the version it was loaded at"""
+
+    def __init__(self, version):
+        self.version = version
+        self.en = CatalogView(Herb, Prescription, PrescriptionHerb, HerbProvince)
+        self.zh = CatalogView(ChineseHerb, ChinesePrescription, ChinesePrescriptionHerb, ChineseHerbProvince)
+
+    def lang(self, lang):
+        return self.en if lang == 'en' else self.zh
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def current_version():
+    try:
+        return int(VERSION_FILE.read_text(encoding='utf-8').strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def get_catalog():
+    """
+    Return the snapshot of this worker, reloading it once if an admin write bumped the version.
+    Must be called inside an app context.
+    """
+    global _catalog
+    version = current_version()
+    catalog = _catalog
+    if catalog is None or catalog.version != version:
+        with _lock:
+            if _catalog is None or _catalog.version != version:
+                _catalog = Catalog(version)
+            catalog = _catalog
+    return catalog
+
+
+def bump_version():
+    """Call after committing a catalog change so that every worker reloads"""
+    # One temp file per thread: with gthread workers two admin writes can bump at the same time
+    tmp_path = VERSION_FILE.with_name(f"{VERSION_FILE.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(str(time.time_ns()), encoding='utf-8')
+    os.replace(tmp_path, VERSION_FILE)
@@ -1,16 +1,36 @@
 # service/coze_client.py
 
 import os
-import time
 from pathlib import Path
 from dotenv import load_dotenv
-from cozepy import Coze, Message, TokenAuth, WebOAuthApp, OAuthToken
+from cozepy import Coze, Message, TokenAuth, WebOAuthApp, OAuthToken, ChatEventType, SyncHTTPClient
 from config import config
+from service.coze_token import TokenManager
+from service.llm_gateway import CHAT_TIMEOUT, http_options
+
+ENV_PATH = Path(__file__).parent.parent / "var.env"
 
 # 1) 自定义异常，必须在 _refresh_token() 里用之前定义
 class NeedReauthorize(Exception):
     """Refresh Token 失效，需要用户重新授权"""
 
+def close_stream(stream):
+    """
+    关掉流式回答的 httpx 响应，客户端中途断开时不再占着上游连接。
+    cozepy 的 Stream 没有公开的 close() 也不是上下文管理器（0.16.2 到 0.20.0 都是），
+    只能关它私有的 _raw_response；requirements.txt 锁定了 cozepy==0.16.2，升级时要重新确认。
+    """
+    if callable(getattr(stream, 'close', None)):
+        # 以后的 cozepy 若加了 close()，优先用它
+        stream.close()
+        return
+    raw_response = getattr(stream, '_raw_response', None)
+    if raw_response is None:
+        print("cozepy Stream has neither close() nor _raw_response, the upstream response is left open")
+        return
+    raw_response.close()
+
+
 class CozeClient:
     def __init__(self):
         # 强烈推荐用 config 而不是 os.getenv 直接读
@@ -21,34 +41,39 @@ class CozeClient:
         )
 
         # 从环境读初始 token（第一次启动前，你必须先跑一次授权拿好这对 token）
-        self.token = OAuthToken(
-            access_token  = config.ACCESS_TOKEN,
-            refresh_token = config.REFRESH_TOKEN,
-            expires_in    = 900,
-        )
-
-        # 初始化 Coze 客户端
-        self._init_client()
-        # 记录上次刷新时间
-        self.last_refresh = time.time()
-
-    def _init_client(self):
-        self.client = Coze(
-            auth     = TokenAuth(self.token.access_token),
-            base_url = config.API_BASE,
+        # 所有 worker 共用 coze_token.json 里的 token，只有一个进程负责刷新，刷新后写回 var.env
+        # 手动改过 var.env（比 coze_token.json 新）或缓存的 token 已过期时，以 var.env 为准
+        self.tokens = TokenManager(
+            self.oauth_app,
+            OAuthToken(
+                access_token  = config.ACCESS_TOKEN,
+                refresh_token = config.REFRESH_TOKEN,
+                expires_in    = 900,
+            ),
+            on_refresh = self._update_env_tokens,
+            initial_mtime = ENV_PATH.stat().st_mtime_ns,
         )
+        self.client = None
+        self._access_token = None
+        # 换 token 重建 Coze 客户端时沿用同一个连接池（带超时和 keep-alive）
+        self.http_client = SyncHTTPClient(**http_options())
+
+    def _get_client(self):
+        # token 被（任意 worker）换过之后才重建 Coze 客户端
+        access_token = self.tokens.access_token()
+        if access_token != self._access_token:
+            self.client = Coze(
+                auth        = TokenAuth(access_token),
+                base_url    = config.API_BASE,
+                http_client = self.http_client,
+            )
+            self._access_token = access_token
+        return self.client
 
     def _refresh_token(self) -> bool:
         try:
-            # 用旧的 refresh_token 去刷新
-            new_token = self.oauth_app.refresh_access_token(self.token.refresh_token)
-            # 更新内存
-            self.token = new_token
-            self.last_refresh = time.time()
-            # 持久化到 var.env
-            self._update_env_tokens()
-            # 用新的 access_token 重建 client
-            self._init_client()
+            # 别的 worker 已经刷新过就直接用新的，不会重复刷新
+            self.tokens.refresh(self._access_token)
             return True
 
         except Exception as e:
@@ -59,19 +84,18 @@ class CozeClient:
             # 其它异常仍然暴炸
             raise RuntimeError(f"Token refresh failed: {msg}")
 
-    def _update_env_tokens(self):
+    def _update_env_tokens(self, token):
         """把最新的 access_token/refresh_token 写回到 var.env，并 reload"""
-        env_path = Path(__file__).parent.parent / "var.env"
-        lines = env_path.read_text(encoding="utf-8").splitlines(keepends=True)
+        lines = ENV_PATH.read_text(encoding="utf-8").splitlines(keepends=True)
 
         for i, line in enumerate(lines):
             if line.startswith("COZE_ACCESS_TOKEN="):
-                lines[i] = f"COZE_ACCESS_TOKEN={self.token.access_token}\n"
+                lines[i] = f"COZE_ACCESS_TOKEN={token.access_token}\n"
             elif line.startswith("COZE_REFRESH_TOKEN="):
-                lines[i] = f"COZE_REFRESH_TOKEN={self.token.refresh_token}\n"
+                lines[i] = f"COZE_REFRESH_TOKEN={token.refresh_token}\n"
 
-        env_path.write_text("".join(lines), encoding="utf-8")
-        load_dotenv(env_path, override=True)
+        ENV_PATH.write_text("".join(lines), encoding="utf-8")
+        load_dotenv(ENV_PATH, override=True)
 
     def authorize_with_code(self, code: str):
         """
@@ -83,22 +107,20 @@ class CozeClient:
             redirect_uri = config.COZE_REDIRECT_URI,
             code         = code,
         )
-        self.token = token
-        self.last_refresh = time.time()
-        self._update_env_tokens()
-        self._init_client()
+        self.tokens.save(token)
+        self._update_env_tokens(token)
 
     def safe_chat(self, message: str, max_retries: int = 2) -> str:
         for attempt in range(max_retries):
             try:
-                # 如果快到期，先刷新
-                if time.time() - self.last_refresh > (self.token.expires_in - 60):
-                    self._refresh_token()
+                # 快到期的 token 由后台线程提前刷新
+                client = self._get_client()
 
-                chat_poll = self.client.chat.create_and_poll(
+                chat_poll = client.chat.create_and_poll(
                     bot_id   = config.BOT_ID,
                     user_id  = config.USER_ID,
                     additional_messages=[Message.build_user_question_text(message)],
+                    poll_timeout = CHAT_TIMEOUT,
                 )
                 # 找到第一个 answer 返回
                 for msg in chat_poll.messages:
@@ -116,5 +138,44 @@ class CozeClient:
                     continue
                 raise
 
+    def stream_chat(self, message: str, max_retries: int = 2):
+        """
+        流式聊天：逐段产出回答文本，其它事件产出 None（调用方可当作心跳）。
+        生成器被关闭时（比如浏览器断开）会关掉到 Coze 的连接，不再等完整回答。
+        只有在还没产出任何文本之前出错才会刷新 token 重试。
+        """
+        for attempt in range(max_retries):
+            started = False
+            stream = None
+            try:
+                # 快到期的 token 由后台线程提前刷新
+                client = self._get_client()
+
+                stream = client.chat.stream(
+                    bot_id   = config.BOT_ID,
+                    user_id  = config.USER_ID,
+                    additional_messages=[Message.build_user_question_text(message)],
+                )
+                for event in stream:
+                    if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA and event.message.type == "answer":
+                        started = True
+                        yield event.message.content
+                    elif event.event == ChatEventType.CONVERSATION_CHAT_FAILED:
+                        raise RuntimeError(f"Chat failed: {event.chat.last_error}")
+                    else:
+                        yield None
+                return
+
+            except NeedReauthorize:
+                raise
+            except Exception:
+                # 已经发出部分回答就不能重来了
+                if started or attempt >= max_retries - 1:
+                    raise
+                self._refresh_token()
+            finally:
+                if stream is not None:
+                    close_stream(stream)
+
 # 全局单例
 coze_client = CozeClient()
@@ -0,0 +1,168 @@
+# service/coze_token.py
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+# The token every gunicorn worker uses. Only the process holding TOKEN_LOCK refreshes it,
+# the others notice the new file on their next request.
+TOKEN_FILE = Path(__file__).parent.parent / "coze_token.json"
+TOKEN_LOCK = Path(__file__).parent.parent / "coze_token.lock"
+
+REFRESH_MARGIN = 120  # Seconds before expiry when the background refresh runs
+FAILURE_BACKOFF = 300  # Seconds the background refresh waits after a failed refresh
+
+
+def expires_at(oauth_token):
+    # Refreshed tokens carry a UNIX timestamp, the one built from var.env a lifetime in seconds
+    if oauth_token.expires_in > 10 ** 9:
+        return oauth_token.expires_in
+    return int(time.time()) + oauth_token.expires_in
+
+
+@contextmanager
+def token_lock():
+    with open(TOKEN_LOCK, 'w') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TokenManager:
+    """
+    Coze OAuth token shared by all the workers through TOKEN_FILE. Refreshes are single-flight:
+    they run under a file lock and are skipped when another process already replaced the token.
+    Each worker also runs a background thread that refreshes shortly before expiry, so requests
+    do not wait for it.
+    """
+
+    def __init__(self, oauth_app, initial_token, on_refresh=None, initial_mtime=None):
+        """`initial_mtime`: st_mtime_ns of the file initial_token was read from (var.env)"""
+        self.oauth_app = oauth_app
+        self.on_refresh = on_refresh  # Called with the new OAuthToken by the refreshing process
+        self._lock = threading.Lock()
+        self._token = None
+        self._mtime = None
+        self._worker_pid = None
+        with self._lock, token_lock():
+            # A token refreshed by another worker is newer than the one of var.env, unless
+            # var.env was edited since or the stored token has expired
+            if not self._load() or self._prefer_initial(initial_token, initial_mtime):
+                self._save(initial_token)
+
+    # The store
+
+    def _load(self):
+        """Re-read TOKEN_FILE if it changed. Returns False if there is no token yet."""
+        try:
+            mtime = TOKEN_FILE.stat().st_mtime_ns
+        except OSError:
+            return False
+        if mtime != self._mtime:
+            try:
+                self._token = json.loads(TOKEN_FILE.read_text(encoding='utf-8'))
+            except ValueError:
+                # Caught between two writes, keep the token we have
+                return self._token is not None
+            self._mtime = mtime
+        return True
+
+    def _prefer_initial(self, initial_token, initial_mtime):
+        if not initial_token.access_token or initial_token.access_token == self._token['access_token']:
+            return False
+        if initial_mtime is not None and initial_mtime > self._mtime:
+            return True
+        return time.time() >= self._token['expires_at']
+
+    def _write(self, token):
+        tmp_path = TOKEN_FILE.with_name(f"{TOKEN_FILE.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(token), encoding='utf-8')
+        os.replace(tmp_path, TOKEN_FILE)
+        self._token = token
+        self._mtime = TOKEN_FILE.stat().st_mtime_ns
+
+    def _save(self, oauth_token):
+        self._write({
+            'access_token': oauth_token.access_token,
+            'refresh_token': oauth_token.refresh_token,
+            'expires_at': expires_at(oauth_token),
+            'failed_at': None,
+        })
+
+    # Public API
+
+    def access_token(self):
+        """The current access token, refreshed first only if it has already expired"""
+        self._start_worker()
+        self._load()
+        if time.time() >= self._token['expires_at']:
+            self.refresh(self._token['access_token'])
+        return self._token['access_token']
+
+    def refresh(self, stale_token=None):
+        """
+        Refresh the token unless another process beat us to it: with `stale_token`, as soon as
+        the stored token differs from it; without, as long as it is not close to expiry.
+        Errors of oauth_app.refresh_access_token are raised to the caller.
+        """
+        with self._lock, token_lock():
+            self._load()
+            token = self._token
+            if stale_token is not None and token['access_token'] != stale_token:
+                return
+            if stale_token is None and time.time() < token['expires_at'] - REFRESH_MARGIN:
+                return
+            try:
+                new_token = self.oauth_app.refresh_access_token(token['refresh_token'])
+            except Exception:
+                self._write({**token, 'failed_at': int(time.time())})
+                raise
+            self._save(new_token)
+            if self.on_refresh:
+                self.on_refresh(new_token)
+
+    def save(self, oauth_token):
+        """Store a token obtained some other way (a new authorization)"""
+        with self._lock, token_lock():
+            self._save(oauth_token)
+
+    # Background refresh
+
+    def _start_worker(self):
+        # Threads do not survive a fork, so every worker process starts its own
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                threading.Thread(target=self._run, name='coze-token-refresh', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._load()
+            token = self._token
+            due = token['expires_at'] - REFRESH_MARGIN
+            if token.get('failed_at'):
+                # The refresh token may be dead: leave it to the request path, which raises
+                # NeedReauthorize, instead of every worker hammering the OAuth endpoint
+                due = max(due, token['failed_at'] + FAILURE_BACKOFF)
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(min(wait, 60))  # Wake up now and then to notice new tokens
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Coze token refresh failed: {e}")
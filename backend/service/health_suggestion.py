@@ -0,0 +1,99 @@
+# service/health_suggestion.py
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert
+
+from config import client
+from database import db, SuggestionCache
+from service.llm_gateway import gateway
+
+AGE_BAND = 10  # years
+HEIGHT_BAND = 10  # cm
+WEIGHT_BAND = 5  # kg
+CACHE_TTL = timedelta(days=30)
+
+MONTHS = {
+    1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June", 7: "July", 8: "August",
+    9: "September", 10: "October", 11: "November", 12: "December",
+}
+
+# Both languages are asked at the same time; shared by the threads of a worker
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='health-suggestion')
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def band(value, width):
+    """(low, high) of the band holding value, None if the value is missing"""
+    value = to_int(value)
+    if value is None or value <= 0:
+        return None
+    low = value // width * width
+    return low, low + width - 1
+
+
+def band_text(value_band):
+    return f"{value_band[0]}-{value_band[1]}" if value_band else "unknown"
+
+
+def profile_key(age, height, weight, month):
+    """Similar profiles share a key: age, height and weight are cut in bands"""
+    month = to_int(month)
+    return '|'.join([band_text(band(age, AGE_BAND)), band_text(band(height, HEIGHT_BAND)),
+                     band_text(band(weight, WEIGHT_BAND)), str(month if month in MONTHS else 'unknown')])
+
+
+def ask(content):
+    # Every call takes a gateway slot: Overloaded is raised when the models are saturated
+    response = gateway.call('deepseek', client.chat.completions.create,
+                            model="deepseek-chat",
+                            messages=[{"role": "assistant", "content": content}])
+    return response.choices[0].message.content
+
+
+def generate(age, height, weight, month):
+    """Ask for the English and the Chinese suggestion concurrently. Returns (en, zh)."""
+    age = band_text(band(age, AGE_BAND))
+    height = band_text(band(height, HEIGHT_BAND))
+    weight = band_text(band(weight, WEIGHT_BAND))
+    month = to_int(month)
+
+    prompt_en = f"Suppose you are a Chinese medicine health expert, I have a user here, age is {age} years " \
+                f"old, height is {height}cm, weight is {weight}kg, the current is {MONTHS.get(month)}, please give " \
+                f"conditioning suggestions, note, just reply to the suggestion, the number of words does not " \
+                f"exceed 150 words, in english. Attention, Some user information may be missing, so don't " \
+                f"worry about it, just respond based on what you already have"
+    prompt_zh = f"假设你是一个中药养生专家，我这里有个用户，年龄{age}岁，身高{height}cm，体重{weight}kg，当前是{month}月，" \
+                f"请给出调理建议，注意，只需回复建议就可以，字数不超过150字，有些用户信息可能是缺失的，那就不用管，只需要根据已有" \
+                f"信息做出回应就可以"
+
+    future_en = executor.submit(ask, prompt_en)
+    future_zh = executor.submit(ask, prompt_zh)
+    return future_en.result(), future_zh.result()
+
+
+def suggestion_for(age, height, weight, month):
+    """(en, zh) suggestion for a profile, from the shared cache or freshly generated"""
+    key = profile_key(age, height, weight, month)
+    cached = db.session.get(SuggestionCache, key)
+    if cached and datetime.utcnow() - cached.created_at < CACHE_TTL:
+        return cached.suggestion_en, cached.suggestion_zh
+
+    suggestion_en, suggestion_zh = generate(age, height, weight, month)
+    # Another worker may have filled the same key meanwhile: the last answer wins
+    stmt = insert(SuggestionCache).values(key=key, suggestion_en=suggestion_en, suggestion_zh=suggestion_zh,
+                                          created_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(index_elements=[SuggestionCache.key], set_={
+        'suggestion_en': stmt.excluded.suggestion_en,
+        'suggestion_zh': stmt.excluded.suggestion_zh,
+        'created_at': stmt.excluded.created_at,
+    })
+    db.session.execute(stmt)
+    return suggestion_en, suggestion_zh
@@ -0,0 +1,66 @@
+# service/http_cache.py
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+
+from service.catalog import current_version
+
+# Cache-Control per blueprint name. "no-cache" still lets the browser keep the body, it only has
+# to revalidate it, and a revalidation that ends in 304 reads the version file and nothing else.
+CACHE_POLICIES = {
+    'herb': 'public, no-cache',
+    'prescription': 'public, no-cache',
+    'image': 'public, max-age=60',
+    'area': 'public, no-cache',
+    'story_bp': 'public, max-age=3600',
+}
+DEFAULT_POLICY = 'no-cache'
+
+
+def version_etag(version):
+    """The same URL returns the same bytes until the catalog version changes"""
+    return hashlib.sha1(f"{version}:{request.full_path}".encode('utf-8')).hexdigest()[:20]
+
+
+def version_last_modified(version):
+    if not version:
+        return None
+    # HTTP dates have a one second resolution
+    return datetime.fromtimestamp(version // 1_000_000_000, timezone.utc)
+
+
+def conditional(view):
+    """
+    ETag / Last-Modified for GET routes that only read catalog data (herbs, prescriptions,
+    banners, story). A matching If-None-Match or If-Modified-Since gets a 304 without running
+    the view. Admin writes call bump_version(), which changes both validators.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = current_version()
+        etag = version_etag(version)
+        last_modified = version_last_modified(version)
+
+        # If-None-Match wins over If-Modified-Since when the client sends both
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(last_modified and request.if_modified_since
+                                and request.if_modified_since >= last_modified)
+
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = CACHE_POLICIES.get(request.blueprint, DEFAULT_POLICY)
+        return response
+    return wrapper
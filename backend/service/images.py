@@ -0,0 +1,158 @@
+# service/images.py
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+UPLOAD_DIR = 'uploads'  # Under the static folder
+# Refuse decompression bombs: no upload needs more than this many pixels
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+# Avatars are cropped square; banners keep their aspect ratio and are only scaled down
+AVATAR_SIZES = {'thumb': 64, 'medium': 256, 'full': 512}
+BANNER_WIDTHS = {'thumb': 480, 'medium': 1280, 'full': 1920}
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image Pillow can decode"""
+
+
+def content_name(data):
+    # Identical uploads get identical names and are only processed once
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def decode(data, largest):
+    """Decode once, upright, at no more than about twice the largest variant for JPEGs"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, much faster for phone photos
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e))
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def flatten(image):
+    """JPEG has no alpha: put transparent images on white"""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def save_variant(image, directory, name):
+    """Write the WebP and JPEG files of one variant, skipping those already on disk"""
+    urls = {}
+    for ext, fmt, options in FORMATS:
+        filename = f"{name}.{ext}"
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            # Written aside then renamed, a concurrent request never serves half a file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            (image if fmt == 'WEBP' else flatten(image)).save(tmp_path, fmt, **options)
+            os.replace(tmp_path, path)
+        urls[ext] = f"/static/{UPLOAD_DIR}/{filename}"
+    return urls
+
+
+def stored_variants(directory, prefix, sizes):
+    """The variants of an identical earlier upload, read from the files' headers; None if incomplete"""
+    variants = {}
+    for variant in sizes:
+        name = f"{prefix}-{variant}"
+        if not all(os.path.exists(os.path.join(directory, f"{name}.{ext}")) for ext, _, _ in FORMATS):
+            return None
+        # Image.open only reads the header
+        with Image.open(os.path.join(directory, f"{name}.jpg")) as image:
+            width, height = image.size
+        variants[variant] = {ext: f"/static/{UPLOAD_DIR}/{name}.{ext}" for ext, _, _ in FORMATS}
+        variants[variant].update(width=width, height=height)
+    return variants
+
+
+def upload_directory():
+    directory = os.path.join(current_app.static_folder, UPLOAD_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def process(data, kind, image=None):
+    """
+    Turn an uploaded avatar or banner into its thumb / medium / full variants.
+    Returns {variant: {'webp': url, 'jpg': url, 'width': w, 'height': h}}, largest last.
+    `image` is the upload already decoded, if the caller did.
+    """
+    sizes = AVATAR_SIZES if kind == 'avatar' else BANNER_WIDTHS
+    directory = upload_directory()
+    prefix = f"{content_name(data)}-{kind}"
+
+    stored = stored_variants(directory, prefix, sizes)
+    if stored:
+        return stored
+
+    if image is None:
+        image = decode(data, max(sizes.values()))
+    variants = {}
+    # Largest first, each one resized from the previous instead of from the original
+    for variant, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        if kind == 'avatar':
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        elif image.width > size:
+            image = image.resize((size, round(image.height * size / image.width)), Image.LANCZOS)
+        variants[variant] = {**save_variant(image, directory, f"{prefix}-{variant}"),
+                             'width': image.width, 'height': image.height}
+    return dict(reversed(variants.items()))
+
+
+def process_upload(file, kind):
+    return process(file.read(), kind)
+
+
+def process_uploads(files, kind):
+    """
+    Process uploads saved together, e.g. the English and Chinese banners: all of them are
+    decoded before any file is written, so an invalid one leaves no variants of the others.
+    """
+    sizes = AVATAR_SIZES if kind == 'avatar' else BANNER_WIDTHS
+    directory = upload_directory()
+    uploads = []
+    for file in files:
+        data = file.read()
+        stored = stored_variants(directory, f"{content_name(data)}-{kind}", sizes)
+        uploads.append((data, None if stored else decode(data, max(sizes.values()))))
+    return [process(data, kind, image) for data, image in uploads]
+
+
+def set_avatar(user, file):
+    """Process an avatar upload and point the user at it: medium for the profile, thumb for lists"""
+    variants = process_upload(file, 'avatar')
+    user.avatar = variants['medium']['jpg']
+    user.avatar_thumb = variants['thumb']['jpg']
+
+
+def srcset(variants, ext='webp'):
+    """<img srcset> of the variants of a banner; a narrow upload has several of the same width"""
+    candidates = {}
+    for v in variants.values():
+        candidates.setdefault(v['width'], v[ext])
+    return ', '.join(f"{url} {width}w" for width, url in candidates.items())
+
+
+def banner_variants(value):
+    """Image.variants_* column -> dict, empty for banners uploaded before the variants existed"""
+    return json.loads(value) if value else {}
+
@@ -0,0 +1,99 @@
+# service/leaderboard.py
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.sqlite import insert
+
+from database import db, QuizAttempt, Rank, Score, User
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+HISTORY_DAYS = 30
+
+# Quiz name in QuizAttempt -> rollup table
+ROLLUPS = {
+    'herb': Rank,
+    'prescription': Score,
+}
+
+
+def score_of(model):
+    """
+    Leaderboard score of a Rank or Score row: accuracy - 0.03 * totalTime. The constant is
+    rendered literally so that SQLite can use the expression index ix_<table>_score.
+    """
+    return model.accuracy - literal_column('0.03') * model.totalTime
+
+
+def small_avatar():
+    # Avatars uploaded before the variants existed only have the original
+    return func.coalesce(User.avatar_thumb, User.avatar)
+
+
+def entry(row, avatar, score):
+    return {
+        "username": row.username,
+        "avatar": avatar,
+        "accuracy": int(row.accuracy),
+        "score": max(int(score), 0)
+    }
+
+
+def top(model, page=1, page_size=PAGE_SIZE):
+    """One page of the leaderboard with the avatars, read in index order in a single query"""
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    score = score_of(model)
+    rows = db.session.query(model, small_avatar(), score) \
+        .outerjoin(User, User.username == model.username) \
+        .order_by(score.desc(), model.id) \
+        .offset((page - 1) * page_size).limit(page_size).all()
+    return [entry(row, avatar, value) for row, avatar, value in rows]
+
+
+def player_rank(model, username):
+    """Rank of a player (ties share a rank) and their entry, or None if they never played"""
+    score = score_of(model)
+    found = db.session.query(model, small_avatar(), score) \
+        .outerjoin(User, User.username == model.username) \
+        .filter(model.username == username).first()
+    if not found:
+        return None
+    row, avatar, value = found
+    # Counted on the score index, without loading the rows ahead
+    ahead = db.session.query(func.count(model.id)).filter(score > value).scalar()
+    return {'rank': ahead + 1, **entry(row, avatar, value)}
+
+
+def record_attempt(quiz, username, accuracy, total_time):
+    """
+    Append the attempt and fold it into the player's running averages. The rollup is one
+    INSERT ... ON CONFLICT DO UPDATE, computed by SQLite from the stored row, so concurrent
+    workers cannot lose an update and the write lock is only held for this transaction.
+    """
+    model = ROLLUPS[quiz]
+    db.session.add(QuizAttempt(quiz=quiz, username=username, accuracy=accuracy, totalTime=total_time))
+
+    row = model.__table__.c
+    stmt = insert(model).values(username=username, accuracy=accuracy, time=1, totalTime=total_time)
+    stmt = stmt.on_conflict_do_update(index_elements=[row.username], set_={
+        # Same running averages as before; every right-hand side reads the old values
+        'accuracy': func.max((row.accuracy * row.time + stmt.excluded.accuracy) / (row.time + 1.0), 0),
+        'totalTime': (row.totalTime * row.time + stmt.excluded.totalTime) / (row.time + 1.0),
+        'time': row.time + 1,
+    })
+    db.session.execute(stmt)
+    db.session.commit()
+
+
+def history(quiz, username, days=HISTORY_DAYS):
+    """Attempts of a player per day over the last `days` days, oldest first"""
+    since = datetime.utcnow() - timedelta(days=days)
+    day = func.date(QuizAttempt.created_at)
+    rows = db.session.query(day, func.count(QuizAttempt.id), func.avg(QuizAttempt.accuracy),
+                            func.avg(QuizAttempt.totalTime)) \
+        .filter(QuizAttempt.username == username, QuizAttempt.quiz == quiz, QuizAttempt.created_at >= since) \
+        .group_by(day).order_by(day).all()
+    return [{'date': date, 'attempts': attempts, 'accuracy': accuracy, 'totalTime': total_time}
+            for date, attempts, accuracy, total_time in rows]
@@ -0,0 +1,171 @@
+# service/llm_gateway.py
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import httpx
+import openai
+from flask import jsonify
+
+# Per worker process: with gunicorn's 8 threads per worker, at most half of them wait on a
+# model at any time and the rest keep serving the catalog.
+MAX_CONCURRENT = 4
+MAX_WAITING = 8  # Calls allowed to queue for a slot; beyond that they are turned away at once
+QUEUE_TIMEOUT = 5  # Seconds a queued call waits for a slot
+RETRY_AFTER = 5  # Seconds suggested to the client in Retry-After
+
+CONNECT_TIMEOUT = 5
+REQUEST_TIMEOUT = 60  # Read timeout of one HTTP call to a model
+CHAT_TIMEOUT = 90  # Coze chat polling, after which the chat is cancelled
+LATENCY_WINDOW = 200  # Latest calls per upstream used for the percentiles
+
+
+class Overloaded(Exception):
+    """The gateway or the model cannot take the call now: 429 or 503 with a Retry-After"""
+
+    def __init__(self, message, status=503, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def overload_response(e):
+    return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+
+def http_options():
+    """Timeouts and keep-alive pool for the httpx clients of the model SDKs"""
+    return {
+        'timeout': httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        'limits': httpx.Limits(max_connections=MAX_CONCURRENT * 2, max_keepalive_connections=MAX_CONCURRENT,
+                               keepalive_expiry=60),
+    }
+
+
+class Gateway:
+    """Concurrency cap with a bounded wait queue in front of every model call, plus metrics"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_waiting=MAX_WAITING, queue_timeout=QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_waiting_seen = 0
+        self.stats = {}  # upstream name -> counters and latest latencies
+
+    def _stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = {'calls': 0, 'errors': 0, 'rejected': 0, 'queueTimeouts': 0,
+                                       'upstreamBusy': 0, 'latencies': deque(maxlen=LATENCY_WINDOW)}
+        return stat
+
+    def _acquire(self, name):
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                self._stat(name)['rejected'] += 1
+                raise Overloaded('Too many requests, please try again later', status=429)
+            self.waiting += 1
+            self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self._stat(name)['queueTimeouts'] += 1
+            raise Overloaded('The assistant is busy, please try again later')
+
+    @contextmanager
+    def slot(self, name):
+        """Hold one of the slots for the duration of a call to `name`"""
+        self._acquire(name)
+        with self._lock:
+            self.in_flight += 1
+        started = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        except GeneratorExit:
+            # A streamed answer whose client went away
+            failed = False
+            raise
+        except (openai.RateLimitError, openai.APITimeoutError, httpx.TimeoutException) as e:
+            with self._lock:
+                self._stat(name)['upstreamBusy'] += 1
+            status = 429 if isinstance(e, openai.RateLimitError) else 503
+            raise Overloaded('The assistant is busy, please try again later', status=status) from e
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+                stat = self._stat(name)
+                stat['calls'] += 1
+                stat['errors'] += failed
+                stat['latencies'].append(time.monotonic() - started)
+
+    def call(self, name, fn, *args, **kwargs):
+        with self.slot(name):
+            return fn(*args, **kwargs)
+
+    def stream(self, name, chunks):
+        """Relay a generator, holding a slot from its first item until it ends or is closed"""
+        with self.slot(name):
+            try:
+                yield from chunks
+            finally:
+                chunks.close()
+
+    def metrics(self):
+        with self._lock:
+            upstreams = {}
+            for name, stat in self.stats.items():
+                latencies = sorted(stat['latencies'])
+                upstreams[name] = {
+                    **{k: v for k, v in stat.items() if k != 'latencies'},
+                    'latency': {
+                        'avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                        'p50': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                        'p95': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+                        'max': round(latencies[-1], 3) if latencies else None,
+                    },
+                }
+            return {
+                'pid': os.getpid(),  # Every worker has its own gateway
+                'maxConcurrent': self.max_concurrent,
+                'maxWaiting': self.max_waiting,
+                'inFlight': self.in_flight,
+                'queueDepth': self.waiting,
+                'maxQueueDepth': self.max_waiting_seen,
+                'upstreams': upstreams,
+            }
+
+
+gateway = Gateway()
+
+
+def gated(name, fn):
+    """fn behind the gateway"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return gateway.call(name, fn, *args, **kwargs)
+    return wrapper
+
+
+def gated_stream(name, fn):
+    """Generator function fn behind the gateway"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return gateway.stream(name, fn(*args, **kwargs))
+    return wrapper
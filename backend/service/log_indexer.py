@@ -0,0 +1,291 @@
+# service/log_indexer.py
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.exceptions import HTTPException
+
+from database import db, AccessRollup, LogOffset
+
+BASE_DIR = Path(__file__).parent.parent
+ACCESS_LOG = BASE_DIR / "logs" / "gunicorn_access.log"
+INDEX_LOCK = BASE_DIR / "logs" / "access_index.lock"
+INTERVAL = 30  # Seconds between two passes of the background indexer
+CATCH_UP_WAIT = 2  # Seconds /api/admin/analyze-logs waits for a running pass before answering
+LOCK_POLL = 0.05  # Seconds between two attempts at the index lock while waiting for it
+CHUNK_SIZE = 4 * 1024 * 1024  # Bytes read and committed at a time
+HEAD_SIZE = 4096  # At most this much of the first line is hashed to recognise a log
+
+# Where the dashboard pages live; the page counters keep the keys the dashboard always had
+SITE = 'http://csi6220-1-vm3.ucd.ie'
+
+# gunicorn's default access_log_format: h l u [t] "r" s b "f" "a"
+LINE = re.compile(r'\[(?P<time>[^\]]+)\] "(?P<request>[^"]*)" (?P<status>\d{3}) \S+ "(?P<referrer>[^"]*)"')
+MONTHS = {m: i for i, m in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+                                      'Nov', 'Dec'), start=1)}
+KINDS = ('page', 'route', 'status')
+
+
+def page_of(path, referrer):
+    """The dashboard page an API call counts for, None if it does not count"""
+    if not path.startswith('/api'):
+        return None
+    # Story mode needs to be handled separately
+    if path.startswith('/api/story'):
+        return f'{SITE}/story' if path.startswith('/api/story/1') else None
+    # Herb Wiki and Prescription Wiki need to be handled separately
+    if path.startswith('/api/herbs') or path.startswith('/api/areas/herb'):
+        return f'{SITE}/herb'
+    if path.startswith('/api/prescriptions'):
+        return f'{SITE}/prescription'
+    if referrer != '-' and not referrer.startswith(f'{SITE}/zh/story'):
+        return referrer
+    return None
+
+
+class Indexer:
+    """Reads the access log from the last indexed byte and folds it into AccessRollup"""
+
+    def __init__(self, url_map, path=None):
+        self.urls = url_map.bind('localhost')
+        self.path = str(path or ACCESS_LOG)
+        # The offset is kept under the file name, not the path, which changes when the app is
+        # deployed to another directory with the same database
+        self.name = os.path.basename(self.path)
+        self._hours = {}  # "19/May/2025:12 +0000" -> UTC hour, parsed once
+        self._routes = {}
+
+    def hour_of(self, timestamp):
+        # "19/May/2025:12:46:40 +0000": only the hour and the offset matter
+        key = timestamp[:14] + timestamp[20:]
+        hour = self._hours.get(key)
+        if hour is None:
+            day, month, rest = timestamp.split('/', 2)
+            year, hh = rest[:4], rest[5:7]
+            offset = timestamp[21:]
+            tz = timezone(timedelta(hours=int(offset[:3]), minutes=int(offset[0] + offset[3:5]))) \
+                if offset else timezone.utc
+            local = datetime(int(year), MONTHS[month], int(day), int(hh), tzinfo=tz)
+            hour = self._hours[key] = local.astimezone(timezone.utc).replace(tzinfo=None)
+        return hour
+
+    def route_of(self, method, path):
+        """The Flask rule a request hit, so /api/herbs/1 and /api/herbs/2 count together"""
+        key = (method, path)
+        route = self._routes.get(key)
+        if route is None:
+            try:
+                rule, _ = self.urls.match(path, method=method, return_rule=True)
+                route = f"{method} {rule.rule}"
+            except HTTPException:
+                route = f"{method} <unmatched>"
+            if len(self._routes) < 100_000:
+                self._routes[key] = route
+        return route
+
+    def count_lines(self, data, counts):
+        for line in data.decode('utf-8', 'replace').splitlines():
+            match = LINE.search(line)
+            if not match:
+                continue  # Not a request line
+            parts = match.group('request').split(' ')
+            if len(parts) < 2:
+                continue
+            method, path = parts[0], parts[1].split('?', 1)[0]
+            try:
+                hour = self.hour_of(match.group('time'))
+            except (ValueError, KeyError, IndexError):
+                continue
+            counts[('route', self.route_of(method, path), hour)] += 1
+            counts[('status', match.group('status'), hour)] += 1
+            page = page_of(path, match.group('referrer'))
+            if page:
+                counts[('page', page, hour)] += 1
+
+    def read(self, path, offset, max_bytes):
+        """Complete lines from offset on, at most max_bytes. Returns (data, new offset)."""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(max_bytes)
+        # A line still being written is picked up next time
+        end = data.rfind(b'\n') + 1
+        return data[:end], offset + end
+
+    def head_of(self, path):
+        """Hash of the first line of a log, None while it has none"""
+        with open(path, 'rb') as f:
+            line = f.readline(HEAD_SIZE)
+        return hashlib.sha1(line).hexdigest() if line.endswith(b'\n') or len(line) == HEAD_SIZE else None
+
+    def save(self, counts, inode, offset, head):
+        """Rollups and the new offset in one transaction, so no line is ever counted twice"""
+        if counts:
+            rows = [{'kind': kind, 'key': key[:500], 'hour': hour, 'count': count}
+                    for (kind, key, hour), count in counts.items()]
+            stmt = insert(AccessRollup)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['kind', 'key', 'hour'],
+                set_={'count': AccessRollup.count + stmt.excluded.count}), rows)
+        state = db.session.get(LogOffset, self.name) or LogOffset(path=self.name)
+        state.inode, state.offset, state.head, state.updated_at = inode, offset, head, datetime.utcnow()
+        db.session.add(state)
+        db.session.commit()
+
+    def offset_state(self):
+        """The saved offset, moving one saved under an absolute path (as it used to be) to the name"""
+        state = db.session.get(LogOffset, self.name)
+        if state is None:
+            legacy = [row for row in LogOffset.query.all() if os.path.basename(row.path) == self.name]
+            if legacy:
+                state = LogOffset(path=self.name, inode=legacy[0].inode, offset=legacy[0].offset,
+                                  head=legacy[0].head, updated_at=legacy[0].updated_at)
+                for row in legacy:
+                    db.session.delete(row)
+                db.session.add(state)
+                db.session.commit()
+        return state
+
+    def run(self, max_bytes=None):
+        """Index what was appended since the last run. Returns the number of bytes read."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0
+        state = self.offset_state()
+        inode, offset, saved_head = (state.inode, state.offset, state.head) if state else (stat.st_ino, 0, None)
+        head = self.head_of(self.path)
+        done = 0
+
+        rotated = f"{self.path}.1"
+        if inode != stat.st_ino and os.path.exists(rotated) and os.stat(rotated).st_ino == inode:
+            # Rotated (RotatingFileHandler / logrotate): finish the old file, now <log>.1
+            while True:
+                counts = Counter()
+                data, offset = self.read(rotated, offset, CHUNK_SIZE)
+                self.count_lines(data, counts)
+                self.save(counts, inode, offset, saved_head)
+                done += len(data)
+                if len(data) == 0:
+                    break
+                if max_bytes is not None and done >= max_bytes:
+                    return done  # The next run carries on in <log>.1
+            inode, offset = stat.st_ino, 0
+        elif inode != stat.st_ino and saved_head and saved_head == head and stat.st_size >= offset:
+            # The same log copied or moved with the app to another directory: carry on
+            inode = stat.st_ino
+        elif inode != stat.st_ino:
+            # A new log whose predecessor is gone
+            inode, offset = stat.st_ino, 0
+        elif stat.st_size < offset or (saved_head and head and head != saved_head):
+            # Truncated in place (copytruncate), perhaps already written past the old offset again
+            offset = 0
+
+        while max_bytes is None or done < max_bytes:
+            counts = Counter()
+            data, offset = self.read(self.path, offset,
+                                     CHUNK_SIZE if max_bytes is None else min(CHUNK_SIZE, max_bytes - done))
+            self.count_lines(data, counts)
+            self.save(counts, inode, offset, head)
+            done += len(data)
+            if len(data) < CHUNK_SIZE // 2:
+                break
+        return done
+
+
+def lock(lock_file, wait):
+    """Take the index lock, waiting up to `wait` seconds for another pass to end. False if it did not."""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_POLL)
+
+
+def index_access_log(app, max_bytes=None, wait=0):
+    """
+    One indexing pass. If another thread or process is already at it, waits up to `wait` seconds
+    for it to end, and returns None if it has not by then. Only one pass at a time may move the
+    offset.
+    """
+    os.makedirs(INDEX_LOCK.parent, exist_ok=True)
+    with open(INDEX_LOCK, 'w') as lock_file:
+        if fcntl and not lock(lock_file, wait):
+            return None
+        try:
+            with app.app_context():
+                return Indexer(app.url_map).run(max_bytes)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def progress(path=None):
+    """(bytes of the current access log indexed, its size): the rollups are behind while the first is smaller"""
+    path = str(path or ACCESS_LOG)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0, 0
+    state = db.session.get(LogOffset, os.path.basename(path))
+    if state is None or state.inode != stat.st_ino:
+        return 0, stat.st_size
+    return min(state.offset, stat.st_size), stat.st_size
+
+
+_started_pid = None
+
+
+def start_indexer(app):
+    """Background indexing thread of this worker; the file lock leaves the work to one of them"""
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    _started_pid = os.getpid()
+
+    def loop():
+        while True:
+            try:
+                index_access_log(app)
+            except Exception as e:
+                print(f"Access log indexing failed: {e}")
+            time.sleep(INTERVAL)
+
+    threading.Thread(target=loop, name='access-log-indexer', daemon=True).start()
+
+
+def totals(kind, start=None, end=None):
+    """{key: count} of one kind of counter over [start, end), from the hourly rollups"""
+    query = db.session.query(AccessRollup.key, func.sum(AccessRollup.count)).filter(AccessRollup.kind == kind)
+    if start:
+        query = query.filter(AccessRollup.hour >= start)
+    if end:
+        query = query.filter(AccessRollup.hour < end)
+    return {key: count for key, count in query.group_by(AccessRollup.key).order_by(func.sum(AccessRollup.count).desc())}
+
+
+def hourly(start=None, end=None):
+    """Requests per hour ({ISO hour: count}), from the status counters which count every request"""
+    hour = AccessRollup.hour
+    query = db.session.query(hour, func.sum(AccessRollup.count)).filter(AccessRollup.kind == 'status')
+    if start:
+        query = query.filter(hour >= start)
+    if end:
+        query = query.filter(hour < end)
+    return {h.isoformat(): count for h, count in query.group_by(hour).order_by(hour)}
@@ -0,0 +1,135 @@
+# service/log_tail.py
+
+import base64
+import os
+import re
+
+from service.log_indexer import LINE
+
+BLOCK_SIZE = 64 * 1024  # Read backwards this many bytes at a time
+MAX_SCAN = 64 * 1024 * 1024  # Bytes a filtered page may scan before handing back a cursor
+EXPORT_CHUNK = 64 * 1024
+
+# gunicorn error log: "[2025-05-19 12:44:05 +0000] [1625886] [INFO] Booting worker ..."
+LEVEL = re.compile(r'^\[[^\]]+\] \[\d+\] \[(?P<level>[A-Z]+)\]')
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or belongs to a file that has been rotated since"""
+
+
+def encode_cursor(inode, offset):
+    return base64.urlsafe_b64encode(f"{inode}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, inode):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        cursor_inode, offset = (int(part) for part in raw.split(':'))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if cursor_inode != inode:
+        raise InvalidCursor('The log has been rotated, reload from the end')
+    return offset
+
+
+def line_filter(level=None, status=None, path=None):
+    """Predicate on a decoded line, None when there is nothing to filter on"""
+    if not (level or status or path):
+        return None
+    level = level.upper() if level else None
+    status = str(status) if status else None
+
+    def keep(line):
+        # Cheap substring checks first, most lines stop here
+        if status and f'" {status} ' not in line:
+            return False
+        if path and path not in line:
+            return False
+        if level:
+            match = LEVEL.match(line)
+            if not match or match.group('level') != level:
+                return False
+        if status or path:
+            match = LINE.search(line)
+            if not match:
+                return False
+            if status and match.group('status') != status:
+                return False
+            if path and path not in match.group('request'):
+                return False
+        return True
+    return keep
+
+
+def lines_backwards(f, end):
+    """(line, start offset) from byte `end` back to the start of the file, one block in memory"""
+    position = end
+    carry = b''
+    while position > 0:
+        size = min(BLOCK_SIZE, position)
+        position -= size
+        f.seek(position)
+        block = f.read(size) + carry
+        lines = block.split(b'\n')
+        # The first piece may be the end of a line that starts in an earlier block
+        carry = lines.pop(0)
+        offset = position + len(carry) + 1
+        starts = []
+        for line in lines:
+            starts.append(offset)
+            offset += len(line) + 1
+        for line, start in zip(reversed(lines), reversed(starts)):
+            yield line, start
+    if end > 0:
+        # The first line, even an empty one
+        yield carry, 0
+
+
+def tail(path, limit, cursor=None, keep=None):
+    """
+    The `limit` lines (that `keep` accepts) ending before `cursor`, oldest first, and the cursor
+    of the page before them (None once the start of the file is reached). The lines keep their
+    newline, as readlines() gives them: the last line of a file not ending with one has none.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [], None
+    end = stat.st_size if cursor is None else min(decode_cursor(cursor, stat.st_ino), stat.st_size)
+
+    page = []
+    start = end
+    with open(path, 'rb') as f:
+        # The file may end with a newline: no empty last line
+        for line, line_start in lines_backwards(f, end):
+            if line_start + len(line) == end and not line:
+                continue
+            start = line_start
+            text = line.decode('utf-8', 'replace').rstrip('\r')
+            if keep is None or keep(text):
+                # Only the end of the file can end a line without a newline
+                page.append(text if line_start + len(line) == end else text + '\n')
+                if len(page) == limit:
+                    break
+            if end - start >= MAX_SCAN:
+                break
+    page.reverse()
+    return page, (encode_cursor(stat.st_ino, start) if start > 0 else None)
+
+
+def export(path, keep=None):
+    """The whole log (filtered) as chunks for a streamed response, reading forward line by line"""
+    buffer = []
+    size = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            line = raw.decode('utf-8', 'replace')
+            if keep is None or keep(line.rstrip('\r\n')):
+                buffer.append(line)
+                size += len(line)
+                if size >= EXPORT_CHUNK:
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,60 @@
+# service/name_matcher.py
+
+from collections import Counter
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+DEFAULT_THRESHOLD = 80  # Same similarity threshold as the original herb <-> formula linking
+
+
+class NameMatcher:
+    """
+    Finds the names whose fuzz.ratio with a query reaches a threshold, without scoring them all.
+
+    fuzz.ratio is 2 * M / (len(a) + len(b)) where M is the number of matching characters, and M
+    can never exceed the characters both names share. A character -> (name ids, counts) index
+    gives that bound for every name at once as a NumPy array; only the names whose bound reaches
+    the threshold are scored with fuzz.ratio, so the matches are exactly those of a full scan.
+    """
+
+    def __init__(self, names):
+        self.names = [name for name in dict.fromkeys(names) if name]
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+        postings = {}
+        for i, name in enumerate(self.names):
+            for char, count in Counter(name).items():
+                ids, counts = postings.setdefault(char, ([], []))
+                ids.append(i)
+                counts.append(count)
+        self.postings = {
+            char: (np.array(ids, dtype=np.int32), np.array(counts, dtype=np.int32))
+            for char, (ids, counts) in postings.items()
+        }
+
+    def candidates(self, name, threshold=DEFAULT_THRESHOLD):
+        """Indexes of the names that may reach the threshold"""
+        shared = np.zeros(len(self.names), dtype=np.int32)
+        for char, count in Counter(name).items():
+            if char in self.postings:
+                ids, counts = self.postings[char]
+                shared[ids] += np.minimum(counts, count)
+        bound = 200.0 * shared / (len(name) + self.lengths)
+        # fuzz.ratio rounds to an integer, so 79.5 may still become 80
+        return np.nonzero(bound >= threshold - 0.5)[0]
+
+    def match(self, name, threshold=DEFAULT_THRESHOLD, reverse=False):
+        """
+        Names with fuzz.ratio(name, candidate) >= threshold, in insertion order.
+        With reverse=True the score is fuzz.ratio(candidate, name), as the argument order can
+        change the score of difflib's matcher.
+        """
+        if not name or not self.names:
+            return []
+        result = []
+        for i in self.candidates(name, threshold):
+            candidate = self.names[i]
+            score = fuzz.ratio(candidate, name) if reverse else fuzz.ratio(name, candidate)
+            if score >= threshold:
+                result.append(candidate)
+        return result
@@ -0,0 +1,111 @@
+# service/provinces.py
+
+import json
+import re
+from pathlib import Path
+
+from database import db, Herb, ChineseHerb, HerbProvince, ChineseHerbProvince
+
+# Bundled province boundaries, built by build_boundaries.py
+BOUNDARY_FILE = Path(__file__).parent.parent / "province_boundaries.json"
+
+# (administrative division code, English name, Chinese name)
+PROVINCES = [
+    (11, 'Beijing', '北京'), (12, 'Tianjin', '天津'), (13, 'Hebei', '河北'), (14, 'Shanxi', '山西'),
+    (15, 'Inner Mongolia', '内蒙古'), (21, 'Liaoning', '辽宁'), (22, 'Jilin', '吉林'),
+    (23, 'Heilongjiang', '黑龙江'), (31, 'Shanghai', '上海'), (32, 'Jiangsu', '江苏'), (33, 'Zhejiang', '浙江'),
+    (34, 'Anhui', '安徽'), (35, 'Fujian', '福建'), (36, 'Jiangxi', '江西'), (37, 'Shandong', '山东'),
+    (41, 'Henan', '河南'), (42, 'Hubei', '湖北'), (43, 'Hunan', '湖南'), (44, 'Guangdong', '广东'),
+    (45, 'Guangxi', '广西'), (46, 'Hainan', '海南'), (50, 'Chongqing', '重庆'), (51, 'Sichuan', '四川'),
+    (52, 'Guizhou', '贵州'), (53, 'Yunnan', '云南'), (54, 'Tibet', '西藏'), (61, 'Shaanxi', '陕西'),
+    (62, 'Gansu', '甘肃'), (63, 'Qinghai', '青海'), (64, 'Ningxia', '宁夏'), (65, 'Xinjiang', '新疆'),
+    (71, 'Taiwan', '台湾'), (81, 'Hong Kong', '香港'), (82, 'Macau', '澳门'),
+]
+
+PROVINCE_NAMES = {code: {'en': en, 'zh': zh} for code, en, zh in PROVINCES}
+
+# Lower-cased English and Chinese name -> code
+PROVINCE_CODES = {}
+for _code, _en, _zh in PROVINCES:
+    PROVINCE_CODES[_en.lower()] = _code
+    PROVINCE_CODES[_zh] = _code
+
+
+def _matcher(names, whole_words):
+    # Longest names first, so that a name is never cut short by another one it starts with
+    alternation = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    if whole_words:
+        return re.compile(r'\b(?:' + alternation + r')\b', re.IGNORECASE)
+    return re.compile(alternation)
+
+
+# One compiled pattern per language, built once at import
+MATCHERS = {
+    'en': _matcher([en for code, en, zh in PROVINCES], True),
+    'zh': _matcher([zh for code, en, zh in PROVINCES], False),
+}
+
+# lang: (herb model, herb -> province link model)
+LANGUAGES = {
+    'en': (Herb, HerbProvince),
+    'zh': (ChineseHerb, ChineseHerbProvince),
+}
+
+
+def province_code(name):
+    """Code of a province from its English (any case) or Chinese name, None if unknown"""
+    return PROVINCE_CODES.get((name or '').strip().lower())
+
+
+def parse_provinces(text, lang):
+    """Province codes named in a production_regions text, in order of first appearance"""
+    matcher = MATCHERS['en' if lang == 'en' else 'zh']
+    return list(dict.fromkeys(PROVINCE_CODES[match.lower()] for match in matcher.findall(text or '')))
+
+
+def load_boundaries(path=BOUNDARY_FILE):
+    """
+    Province code -> {"type": "Polygon" | "MultiPolygon", "coordinates": [...]} with the
+    coordinates already as [lat, lng], ready to be sent to the map.
+    """
+    try:
+        with open(path, mode='r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Province boundaries not loaded from {path}: {e}")
+        return {}
+    return {int(code): {'type': area['type'], 'coordinates': area['coordinates']}
+            for code, area in data['provinces'].items()}
+
+
+
+# The functions below keep the herb -> province link tables in sync with production_regions
+
+def save_herb_provinces(lang, herb):
+    """Reparse a new or edited herb (already flushed, so it has an id); the caller commits"""
+    herb_model, link_model = LANGUAGES[lang]
+    link_model.query.filter_by(herb_id=herb.id).delete()
+    for position, code in enumerate(parse_provinces(herb.production_regions, lang)):
+        db.session.add(link_model(herb_id=herb.id, province_code=code, position=position))
+
+
+def delete_herb_provinces(lang, herb_id):
+    herb_model, link_model = LANGUAGES[lang]
+    link_model.query.filter_by(herb_id=herb_id).delete()
+
+
+def rebuild_herb_provinces():
+    """Reparse every herb of both languages in one transaction. Returns the links per language."""
+    counts = {}
+    for lang, (herb_model, link_model) in LANGUAGES.items():
+        rows = [
+            {'herb_id': hid, 'province_code': code, 'position': position}
+            for hid, regions in db.session.query(herb_model.id, herb_model.production_regions).all()
+            for position, code in enumerate(parse_provinces(regions, lang))
+        ]
+        db.session.query(link_model).delete()
+        if rows:
+            db.session.execute(link_model.__table__.insert(), rows)
+        counts[lang] = len(rows)
+    db.session.commit()
+    return counts
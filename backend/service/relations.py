@@ -0,0 +1,150 @@
+# service/relations.py
+
+import json
+
+from sqlalchemy import update
+
+from database import db, split_constitute, Herb, ChineseHerb, Prescription, ChinesePrescription, PrescriptionHerb, \
+    ChinesePrescriptionHerb
+from service.catalog import get_catalog
+from service.name_matcher import NameMatcher
+
+# lang: (herb model, prescription model, link model, fuzzy name matching)
+LANGUAGES = {
+    'en': (Herb, Prescription, PrescriptionHerb, False),
+    'zh': (ChineseHerb, ChinesePrescription, ChinesePrescriptionHerb, True),
+}
+
+
+def constituent_index(prescriptions):
+    """(id, constitute) pairs -> lower-cased constituent name -> {prescription id: position}"""
+    index = {}
+    for pid, constitute in prescriptions:
+        for position, name in enumerate(split_constitute(constitute)):
+            index.setdefault(name.lower(), {}).setdefault(pid, position)
+    return index
+
+
+def herb_links(index, name, matcher=None):
+    """
+    Prescription id -> position of the herb in the prescription. With a matcher, prescriptions
+    with a constituent similar to the name are linked too, with position None.
+    """
+    name = name.strip().lower()
+    links = dict(index.get(name, {}))
+    if matcher:
+        for constituent in matcher.match(name):
+            for pid in index[constituent]:
+                links.setdefault(pid, None)
+    return links
+
+
+def prescription_links(view, constitute, fuzzy):
+    """Herb id -> position, for a prescription made of `constitute`"""
+    names = [name.lower() for name in split_constitute(constitute)]
+    links = {}
+    for position, name in enumerate(names):
+        for hid in view.herb_ids_by_lower_name.get(name, ()):
+            links.setdefault(hid, position)
+    if fuzzy:
+        for name in names:
+            # Score as herb_links() does: the herb name first, the constituent second
+            for herb_name in view.herb_matcher.match(name, reverse=True):
+                for hid in view.herb_ids_by_lower_name[herb_name]:
+                    links.setdefault(hid, None)
+    return links
+
+
+def _sync(link_model, column, key, links):
+    """
+    Bring the link rows of one herb (column='herb_id') or prescription (column='prescription_id')
+    to `links`. Only the difference is written; returns the ids on the other side that gained or
+    lost a link.
+    """
+    other_column = 'prescription_id' if column == 'herb_id' else 'herb_id'
+    changed = set()
+    existing = set()
+    for row in link_model.query.filter(getattr(link_model, column) == key).all():
+        other_id = getattr(row, other_column)
+        existing.add(other_id)
+        if other_id not in links:
+            db.session.delete(row)
+            changed.add(other_id)
+        elif row.position != links[other_id]:
+            row.position = links[other_id]
+    for other_id, position in links.items():
+        if other_id not in existing:
+            db.session.add(link_model(**{column: key, other_column: other_id, 'position': position}))
+            changed.add(other_id)
+    return changed
+
+
+def _refresh_relate(herb_model, link_model, herb_ids):
+    """Rewrite the relate_prescription JSON of the given herbs from the link table"""
+    if not herb_ids:
+        return
+    db.session.flush()
+    relate = {hid: [] for hid in herb_ids}
+    rows = db.session.query(link_model.herb_id, link_model.prescription_id) \
+        .filter(link_model.herb_id.in_(herb_ids)).order_by(link_model.prescription_id).all()
+    for hid, pid in rows:
+        relate[hid].append(pid)
+    for herb in herb_model.query.filter(herb_model.id.in_(herb_ids)).all():
+        herb.relate_prescription = json.dumps(relate[herb.id])
+
+
+# The functions below only stage changes in the session: the caller commits once, then bumps
+# the catalog version.
+
+def save_herb(lang, herb):
+    """Relink a new or edited herb (already flushed, so it has an id)"""
+    herb_model, prescription_model, link_model, fuzzy = LANGUAGES[lang]
+    view = get_catalog().lang(lang)
+    links = herb_links(view.constituent_index, herb.name, view.constituent_matcher if fuzzy else None)
+    _sync(link_model, 'herb_id', herb.id, links)
+    herb.relate_prescription = json.dumps(sorted(links))
+
+
+def delete_herb(lang, herb_id):
+    herb_model, prescription_model, link_model, fuzzy = LANGUAGES[lang]
+    _sync(link_model, 'herb_id', herb_id, {})
+
+
+def save_prescription(lang, prescription):
+    """Relink a new or edited prescription (already flushed, so it has an id)"""
+    herb_model, prescription_model, link_model, fuzzy = LANGUAGES[lang]
+    links = prescription_links(get_catalog().lang(lang), prescription.constitute, fuzzy)
+    changed = _sync(link_model, 'prescription_id', prescription.id, links)
+    _refresh_relate(herb_model, link_model, changed)
+
+
+def delete_prescription(lang, prescription_id):
+    herb_model, prescription_model, link_model, fuzzy = LANGUAGES[lang]
+    changed = _sync(link_model, 'prescription_id', prescription_id, {})
+    _refresh_relate(herb_model, link_model, changed)
+
+
+def rebuild_relations():
+    """
+    Full resync: recompute every link of both languages from the herb names and constitute
+    lists, in a single transaction. Returns the number of links per language.
+    """
+    counts = {}
+    for lang, (herb_model, prescription_model, link_model, fuzzy) in LANGUAGES.items():
+        index = constituent_index(db.session.query(prescription_model.id, prescription_model.constitute))
+        matcher = NameMatcher(index) if fuzzy else None
+        rows = []
+        relate = []
+        for hid, name in db.session.query(herb_model.id, herb_model.name).all():
+            links = herb_links(index, name, matcher)
+            rows.extend({'prescription_id': pid, 'herb_id': hid, 'position': position}
+                        for pid, position in links.items())
+            relate.append({'id': hid, 'relate_prescription': json.dumps(sorted(links))})
+        db.session.query(link_model).delete()
+        if rows:
+            db.session.execute(link_model.__table__.insert(), rows)
+        if relate:
+            db.session.execute(update(herb_model), relate)
+        counts[lang] = len(rows)
+    db.session.commit()
+    return counts
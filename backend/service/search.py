@@ -0,0 +1,75 @@
+# service/search.py
+
+import re
+
+from sqlalchemy import text
+
+from database import db, SEARCH_TABLES, sync_search
+
+PAGE_SIZE = 50  # When only ?page is given
+MAX_PAGE_SIZE = 200
+
+# A run of Chinese characters, or a word of any other script
+TERM_PATTERN = re.compile(r'[㐀-鿿豈-﫿]+|[^\W_㐀-鿿豈-﫿]+')
+CJK_RUN = re.compile(r'[㐀-鿿豈-﫿]+')
+
+# kind: (EN fts table, ZH fts table, {lang: result table}, result columns)
+SEARCH_KINDS = {
+    'herb': ('herb_fts', 'chinese_herb_fts', {'en': 'herb', 'zh': 'chinese_herb'}, 't.id, t.name, t.image'),
+    'prescription': ('prescription_fts', 'chinese_prescription_fts',
+                     {'en': 'prescription', 'zh': 'chinese_prescription'}, 't.id, t.name'),
+}
+
+
+def match_query(keyword):
+    """
+    Turn user input into an FTS5 MATCH expression: every Chinese run becomes a phrase of
+    single characters (the index holds one token per character), every other word a prefix.
+    Returns '' when the input holds nothing searchable.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(keyword.lower()):
+        if CJK_RUN.fullmatch(term):
+            terms.append('"' + ' '.join(term) + '"')
+        else:
+            terms.append('"' + term + '"*')
+    return ' '.join(terms)
+
+
+def _bm25(fts_table):
+    weights = ', '.join(str(weight) for weight in SEARCH_TABLES[fts_table][2])
+    return f"bm25({fts_table}, {weights})"
+
+
+def search(kind, keyword, lang, page=None, page_size=None):
+    """
+    Search both languages at once and return the rows of the requested language, best bm25 rank
+    first: every match, or one page of them when page or page_size is given
+    """
+    query = match_query(keyword)
+    if not query:
+        return []
+    # Rows written since the last search, by the app or any other client
+    sync_search()
+    en_fts, zh_fts, tables, columns = SEARCH_KINDS[kind]
+    table = tables['en' if lang == 'en' else 'zh']
+    paged = page is not None or page_size is not None
+    page = max(page or 1, 1)
+    page_size = min(max(page_size or PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+    sql = text(f"""
+        SELECT {columns} FROM (
+            SELECT rowid AS id, {_bm25(en_fts)} AS score FROM {en_fts} WHERE {en_fts} MATCH :query
+            UNION ALL
+            SELECT rowid AS id, {_bm25(zh_fts)} AS score FROM {zh_fts} WHERE {zh_fts} MATCH :query
+        ) AS m
+        JOIN {table} AS t ON t.id = m.id
+        GROUP BY t.id
+        ORDER BY MIN(m.score), t.id
+        LIMIT :limit OFFSET :offset
+    """)
+    return db.session.execute(sql, {
+        'query': query,
+        'limit': page_size if paged else -1,  # -1: no limit
+        'offset': (page - 1) * page_size if paged else 0,
+    }).mappings().all()
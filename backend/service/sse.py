@@ -0,0 +1,45 @@
+# service/sse.py
+
+import json
+from itertools import chain
+
+from flask import Response
+
+
+def sse_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(chunks):
+    """
+    Relay a text stream (see CozeClient.stream_chat) as Server-Sent Events:
+    `message` events with {"delta": ...}, then `done`, or `error` if the stream breaks.
+
+    The first item is read before the response starts, so that authorization errors still
+    reach the route as exceptions (and become a 401). When the client goes away, the WSGI
+    server closes this generator, which closes `chunks` and with it the upstream request.
+    """
+    try:
+        first = next(chunks)
+        ended = False
+    except StopIteration:
+        first = None
+        ended = True
+
+    def generate():
+        try:
+            if not ended:
+                for chunk in chain([first], chunks):
+                    # Other events become comments: they keep proxies from timing out and let a
+                    # disconnect show up as a failed write before the next token
+                    yield ': ping\n\n' if chunk is None else sse_event('message', {'delta': chunk})
+            yield sse_event('done', {})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            chunks.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # No buffering in an nginx proxy
+    })
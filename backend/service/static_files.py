@@ -0,0 +1,79 @@
+# service/static_files.py
+
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+# Vite names every built file <name>-<8 character hash>.<ext>: a new build gets new names, so
+# these can be cached for good
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+# Processed uploads are named after their content (see service/images.py)
+CONTENT_ADDRESSED = re.compile(r'^uploads/[0-9a-f]{20}-[a-z]+-[a-z]+\.[a-z]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STORY_MAX_AGE = 24 * 3600  # Story media only changes with a reseed
+DEFAULT_MAX_AGE = 3600  # Banners and other uploads; revalidated with ETag afterwards
+
+# Worth compressing; images, audio and fonts already are. See compress_static.py
+COMPRESSIBLE = {'.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.xml', '.ico',
+                '.webmanifest', '.pdf'}
+# Preferred first
+SIDECARS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def max_age_for(filename):
+    if HASHED_ASSET.match(filename) or CONTENT_ADDRESSED.match(filename):
+        return IMMUTABLE_MAX_AGE
+    if filename.startswith('Story/'):
+        return STORY_MAX_AGE
+    return DEFAULT_MAX_AGE
+
+
+def fresh_sidecar(directory, filename, suffix):
+    """
+    Whether filename has a sidecar at least as new as itself. One left over from an earlier
+    build (compress_static.py not rerun) would otherwise be served in place of the new file.
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        return False
+    # Relative to the app, as send_from_directory resolves it
+    path = os.path.join(current_app.root_path, path)
+    try:
+        return os.stat(path + suffix).st_mtime >= os.stat(path).st_mtime
+    except OSError:  # No sidecar built for this file
+        return False
+
+
+def send_compressed(directory, filename, max_age=None):
+    """
+    send_from_directory, but picks a prebuilt .br / .gz sidecar when the client accepts it.
+    Range requests (audio seeking) always get the identity bytes, which send_file answers with
+    a 206; If-None-Match / If-Modified-Since get a 304 as before.
+    """
+    response = None
+    compressible = os.path.splitext(filename)[1].lower() in COMPRESSIBLE
+    if compressible and 'Range' not in request.headers:
+        for encoding, suffix in SIDECARS:
+            if encoding not in request.accept_encodings or not fresh_sidecar(directory, filename, suffix):
+                continue
+            response = send_from_directory(directory, filename + suffix, max_age=max_age,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.content_encoding = encoding
+            # Byte ranges are only offered on the identity bytes
+            del response.headers['Accept-Ranges']
+            break
+    if response is None:
+        response = send_from_directory(directory, filename, max_age=max_age)
+    if compressible:
+        response.vary.add('Accept-Encoding')
+    if max_age == IMMUTABLE_MAX_AGE:
+        response.cache_control.immutable = True
+    return response
+
+
+def serve_static(filename):
+    """View of the /static/<path:filename> route"""
+    return send_compressed(current_app.static_folder, filename, max_age_for(filename))
@@ -0,0 +1,110 @@
+# service/story.py
+
+import json
+import threading
+
+from database import StoryMode
+from service.catalog import current_version
+
+
+def node_dict(story):
+    return {
+        "story_number": story.story_number,
+        "id": story.id,
+        "label": story.scene,
+        "speaker": story.character,
+        "dialog": story.text,
+        "choices": json.loads(story.option or "[]"),
+        "next_id": json.loads(story.next or "[]"),
+        "background": story.bg_image,
+        "character_image": json.loads(story.character_image or "[]"),
+        "audio": story.audio_file,
+        "speaker_en": story.character_en,
+        "dialog_en": story.text_en,
+        "choices_en": json.loads(story.option_en or "[]"),
+    }
+
+
+def distinct(values):
+    result = []
+    for value in values:
+        if value and value not in result:
+            result.append(value)
+    return result
+
+
+class StoryGraph:
+    """Every story node decoded once, keyed by (story_number, id), with the successors of each"""
+
+    def __init__(self, version):
+        self.version = version
+        self.nodes = {}
+        self.ids_by_story = {}  # story_number -> node ids in table order, the first one starts it
+        for story in StoryMode.query.order_by(StoryMode.story_number, StoryMode.id).all():
+            self.nodes[(story.story_number, story.id)] = node_dict(story)
+            self.ids_by_story.setdefault(story.story_number, []).append(story.id)
+        # The old routes only take a node id: same as filter_by(id=...).first(), the lowest story wins
+        self.story_by_id = {}
+        for story_number, node_id in self.nodes:
+            self.story_by_id.setdefault(node_id, story_number)
+        # The whole story serialized once, what /<number>/bundle sends as is
+        self.bundles = {number: json.dumps(self._bundle(number), ensure_ascii=False)
+                        for number in self.ids_by_story}
+
+    def node(self, story_number, node_id):
+        return self.nodes.get((story_number, node_id))
+
+    def find(self, node_id):
+        """Node by id alone, for the routes that do not name a story"""
+        story_number = self.story_by_id.get(node_id)
+        return None if story_number is None else self.nodes[(story_number, node_id)]
+
+    def first(self):
+        if not self.ids_by_story:
+            return None
+        story_number = min(self.ids_by_story)
+        return self.nodes[(story_number, self.ids_by_story[story_number][0])]
+
+    def successors(self, node):
+        """The nodes the choices of `node` lead to, in choice order; dangling ids are skipped"""
+        result = []
+        for next_id in node["next_id"]:
+            next_node = self.nodes.get((node["story_number"], next_id))
+            if next_node:
+                result.append(next_node)
+        return result
+
+    def manifest(self, story_number):
+        """Every asset the story can show or play, for the client to prefetch"""
+        nodes = [self.nodes[(story_number, node_id)] for node_id in self.ids_by_story[story_number]]
+        return {
+            "backgrounds": distinct(node["background"] for node in nodes),
+            "character_images": distinct(image for node in nodes for image in node["character_image"]),
+            "audio": distinct(node["audio"] for node in nodes),
+        }
+
+    def _bundle(self, story_number):
+        ids = self.ids_by_story[story_number]
+        return {
+            "story_number": story_number,
+            "start": ids[0],
+            "nodes": {str(node_id): self.nodes[(story_number, node_id)] for node_id in ids},
+            "manifest": self.manifest(story_number),
+        }
+
+
+_graph = None
+_lock = threading.Lock()
+
+
+def get_story_graph():
+    """The graph of this worker, rebuilt when the catalog version changes (reseed). Needs an app context."""
+    global _graph
+    version = current_version()
+    graph = _graph
+    if graph is None or graph.version != version:
+        with _lock:
+            if _graph is None or _graph.version != version:
+                _graph = StoryGraph(version)
+            graph = _graph
+    return graph
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# The backend modules import each other from the backend folder (from database import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, init_db  # noqa: E402
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    init_db(app)
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on an empty database of its own"""
+    app = make_app(tmp_path / 'database.db')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope='session')
+def seeded_app(tmp_path_factory):
+    """An app on a database seeded from the bundled CSV files, shared by the whole run: read only"""
+    import seed
+    from service import catalog
+
+    directory = tmp_path_factory.mktemp('seeded')
+    with pytest.MonkeyPatch.context() as patch:
+        # Keep the seed lock and the catalog version of the checkout out of it
+        patch.setattr(seed, 'SEED_LOCK', str(directory / 'seed.lock'))
+        patch.setattr(seed, 'VERSION_FILE', directory / 'catalog.version')
+        patch.setattr(catalog, 'VERSION_FILE', directory / 'catalog.version')
+        app = make_app(directory / 'database.db')
+        seed.seed_database(app)
+        with app.app_context():
+            yield app
@@ -0,0 +1,58 @@
+import pytest
+
+from database import db, AnswerCache, Counter
+from service import answer_cache
+from service.answer_cache import cache_key, lookup, normalize, stats, store
+
+
+@pytest.fixture(autouse=True)
+def no_pending(monkeypatch):
+    # The pending hits are per process: start every test from none
+    monkeypatch.setattr(answer_cache, '_pending_hits', {})
+    monkeypatch.setattr(answer_cache, '_pending_counts', {})
+
+
+def written(name):
+    db.session.expire_all()
+    counter = db.session.get(Counter, name)
+    return counter.value if counter else 0
+
+
+def test_normalize_folds_case_space_and_punctuation():
+    assert normalize("What is Ginseng?") == normalize("what is  ginseng")
+    assert normalize("人参，是什么？") == normalize("人参是什么")
+    assert normalize("ＧＩＮＳＥＮＧ") == normalize("ginseng")
+
+
+def test_normalize_keeps_numbers_apart():
+    assert normalize("1.5 g") != normalize("15g")
+    assert normalize("1.5 g") == normalize("1 ,5g")
+    assert cache_key("take 3 10 g doses") != cache_key("take 310 g doses")
+
+
+def test_lookup_does_not_write_before_the_flush(app, monkeypatch):
+    monkeypatch.setattr(answer_cache, 'FLUSH_INTERVAL', 3600)
+    monkeypatch.setattr(answer_cache, '_last_flush', answer_cache.time.monotonic())
+    store("What is ginseng?", "A root")
+    for _ in range(3):
+        assert lookup("what is ginseng") == "A root"
+    assert lookup("what is licorice") is None
+
+    assert written('answer_cache.hit') == 0
+    assert db.session.get(AnswerCache, cache_key("what is ginseng")).hits == 0
+
+    result = stats()
+    assert (result['hits'], result['misses']) == (3, 1)
+    assert db.session.get(AnswerCache, cache_key("what is ginseng")).hits == 3
+
+
+def test_lookup_flushes_after_the_interval(app, monkeypatch):
+    monkeypatch.setattr(answer_cache, 'FLUSH_INTERVAL', 0)
+    store("What is ginseng?", "A root")
+    entry = db.session.get(AnswerCache, cache_key("what is ginseng"))
+    stored_at = entry.last_used
+    assert lookup("what is ginseng") == "A root"
+    assert written('answer_cache.hit') == 1
+    entry = db.session.get(AnswerCache, cache_key("what is ginseng"))
+    assert entry.hits == 1
+    assert entry.last_used >= stored_at
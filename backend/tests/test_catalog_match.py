@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from service.catalog import Catalog
+
+
+@pytest.fixture(scope='module')
+def catalog(seeded_app):
+    return Catalog(0)
+
+
+def baseline_exact(view, herb_ids):
+    """getFuzzyPrescription's precision scan before the index: every prescription, every herb"""
+    result = []
+    for prescription in view.prescriptions:
+        names = prescription.constitute_names
+        if len(names) != len(herb_ids):
+            continue
+        if all(view.herb(hid) and view.herb(hid).name in names for hid in herb_ids):
+            result.append(prescription.id)
+    return result
+
+
+def brute_force_ranked(view, herb_ids, limit):
+    """Jaccard overlap of the selection with every prescription, scored pair by pair"""
+    selected = {hid for hid in herb_ids if view.herb(hid)}
+    scored = []
+    for prescription in view.prescriptions:
+        shared = sum(1 for hid in selected if prescription.id in view.herb(hid).relate_prescription)
+        if not shared:
+            continue
+        size = max(len(prescription.constitute_names), shared)
+        scored.append((-shared / (len(selected) + size - shared), -shared, prescription.id))
+    return [pid for _, _, pid in sorted(scored)[:limit]]
+
+
+def selections(view, count=300):
+    rng = random.Random(2002)
+    herb_ids = [h.id for h in view.herbs]
+    # Whole prescriptions (exact matches), parts of them, and random herbs
+    complete = [p for p in view.prescriptions if p.constitute_ids and -1 not in p.constitute_ids]
+    for _ in range(count):
+        p = rng.choice(complete)
+        ids = list(dict.fromkeys(p.constitute_ids))
+        yield ids
+        yield rng.sample(ids, max(1, len(ids) // 2))
+        yield rng.sample(herb_ids, rng.randint(1, 6))
+
+
+@pytest.mark.parametrize('lang', ['en', 'zh'])
+def test_matches_brute_force_scoring(catalog, lang):
+    view = catalog.lang(lang)
+    exact_matches = 0
+    for herb_ids in selections(view):
+        exact, ranked = view.match_prescriptions(herb_ids, 5)
+        assert [p.id for p in ranked] == brute_force_ranked(view, herb_ids, 5), herb_ids
+        assert [p.id for p in exact] == baseline_exact(view, herb_ids), herb_ids
+        exact_matches += bool(exact)
+    assert exact_matches
+
+
+@pytest.mark.parametrize('lang', ['en', 'zh'])
+def test_ties_are_broken_by_shared_herbs_then_id(catalog, lang):
+    view = catalog.lang(lang)
+    # A herb found in many prescriptions: lots of equal scores
+    herb = max(view.herbs, key=lambda h: len(h.relate_prescription))
+    exact, ranked = view.match_prescriptions([herb.id], len(herb.relate_prescription))
+    assert [p.id for p in ranked] == brute_force_ranked(view, [herb.id], len(herb.relate_prescription))
+    sizes = [len(p.constitute_names) for p in ranked]
+    assert sizes == sorted(sizes)
+    for a, b in zip(ranked, ranked[1:]):
+        if len(a.constitute_names) == len(b.constitute_names):
+            assert a.id < b.id
+
+
+@pytest.mark.parametrize('herb_ids', [[], [-1], [10 ** 9]])
+def test_empty_selection(catalog, herb_ids):
+    assert catalog.lang('en').match_prescriptions(herb_ids, 5) == ([], [])
@@ -0,0 +1,61 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from service import coze_token
+from service.coze_token import TokenManager
+
+
+def oauth_token(access_token, expires_in=900):
+    return SimpleNamespace(access_token=access_token, refresh_token=f"refresh-{access_token}",
+                           expires_in=expires_in)
+
+
+@pytest.fixture(autouse=True)
+def token_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(coze_token, 'TOKEN_FILE', tmp_path / 'coze_token.json')
+    monkeypatch.setattr(coze_token, 'TOKEN_LOCK', tmp_path / 'coze_token.lock')
+    return tmp_path / 'coze_token.json'
+
+
+def cache(token_file, access_token, expires_at):
+    token_file.write_text(json.dumps({'access_token': access_token, 'refresh_token': 'cached-refresh',
+                                      'expires_at': expires_at, 'failed_at': None}), encoding='utf-8')
+    return token_file.stat().st_mtime_ns
+
+
+def stored(token_file):
+    return json.loads(token_file.read_text(encoding='utf-8'))['access_token']
+
+
+def test_no_cache_takes_var_env(token_file):
+    TokenManager(None, oauth_token('env'), initial_mtime=1)
+    assert stored(token_file) == 'env'
+
+
+def test_cache_newer_than_var_env_wins(token_file):
+    mtime = cache(token_file, 'refreshed', time.time() + 600)
+    TokenManager(None, oauth_token('env'), initial_mtime=mtime - 1)
+    assert stored(token_file) == 'refreshed'
+
+
+def test_var_env_edited_after_the_cache_wins(token_file):
+    mtime = cache(token_file, 'refreshed', time.time() + 600)
+    TokenManager(None, oauth_token('edited'), initial_mtime=mtime + 1)
+    assert stored(token_file) == 'edited'
+
+
+def test_expired_cache_gives_way_to_var_env(token_file):
+    mtime = cache(token_file, 'refreshed', time.time() - 1)
+    TokenManager(None, oauth_token('env'), initial_mtime=mtime - 1)
+    assert stored(token_file) == 'env'
+
+
+def test_same_token_keeps_the_cached_expiry(token_file):
+    # on_refresh writes the refreshed token back to var.env right after the cache
+    expires_at = int(time.time()) + 60
+    mtime = cache(token_file, 'refreshed', expires_at)
+    TokenManager(None, oauth_token('refreshed'), initial_mtime=mtime + 1)
+    assert json.loads(token_file.read_text(encoding='utf-8'))['expires_at'] == expires_at
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from PIL import Image
+
+from service.images import InvalidImage, UPLOAD_DIR, process_uploads
+
+
+def upload(data):
+    return io.BytesIO(data)
+
+
+def jpeg(width, height, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def uploads_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    return tmp_path / UPLOAD_DIR
+
+
+def test_banner_pair_is_written(uploads_dir):
+    variants_en, variants_zh = process_uploads([upload(jpeg(800, 400, 'red')), upload(jpeg(600, 300, 'blue'))],
+                                               'banner')
+    assert variants_en['full']['width'] == 800
+    assert variants_zh['full']['width'] == 600
+    # 3 variants x 2 formats of each banner
+    assert len(list(uploads_dir.iterdir())) == 12
+
+
+def test_invalid_second_banner_leaves_no_files(uploads_dir):
+    with pytest.raises(InvalidImage):
+        process_uploads([upload(jpeg(800, 400, 'red')), upload(b'not an image')], 'banner')
+    assert list(uploads_dir.iterdir()) == []
+
+
+def test_identical_upload_reuses_the_stored_variants(uploads_dir):
+    data = jpeg(800, 400, 'red')
+    first, = process_uploads([upload(data)], 'banner')
+    written = {path: path.stat().st_mtime_ns for path in uploads_dir.iterdir()}
+    second, = process_uploads([upload(data)], 'banner')
+    assert second == first
+    assert {path: path.stat().st_mtime_ns for path in uploads_dir.iterdir()} == written
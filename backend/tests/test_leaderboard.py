@@ -0,0 +1,61 @@
+import pytest
+
+from database import db, QuizAttempt, Rank, Score
+from service.leaderboard import PAGE_SIZE, player_rank, record_attempt, top
+
+
+def rollup(model, username):
+    db.session.expire_all()
+    return model.query.filter_by(username=username).one()
+
+
+def test_first_attempt_creates_the_rollup(app):
+    record_attempt('herb', 'alice', 80, 30)
+    row = rollup(Rank, 'alice')
+    assert (row.accuracy, row.totalTime, row.time) == (80, 30, 1)
+    assert QuizAttempt.query.filter_by(username='alice', quiz='herb').count() == 1
+    assert Score.query.count() == 0
+
+
+def test_repeat_attempt_updates_the_same_row(app):
+    record_attempt('prescription', 'bob', 80, 30)
+    record_attempt('prescription', 'bob', 60, 60)
+    assert Score.query.filter_by(username='bob').count() == 1
+    row = rollup(Score, 'bob')
+    assert (row.accuracy, row.totalTime, row.time) == (70, 45, 2)
+
+
+def test_running_average_over_several_attempts(app):
+    attempts = [(80, 30), (60, 60), (100, 90), (51, 10), (0, 400)]
+    for accuracy, total_time in attempts:
+        record_attempt('herb', 'carol', accuracy, total_time)
+    row = rollup(Rank, 'carol')
+    assert row.time == len(attempts)
+    assert row.accuracy == pytest.approx(sum(a for a, _ in attempts) / len(attempts))
+    assert row.totalTime == pytest.approx(sum(t for _, t in attempts) / len(attempts))
+    # Other players are left alone
+    record_attempt('herb', 'dave', 10, 10)
+    assert rollup(Rank, 'carol').time == len(attempts)
+
+
+def test_player_rank_on_and_beyond_the_first_page(app):
+    # Distinct scores, best first: player00 > player01 > ...
+    players = [f'player{i:02}' for i in range(PAGE_SIZE * 2 + 5)]
+    for i, username in enumerate(players):
+        record_attempt('herb', username, 100 - i, 10)
+
+    board = top(Rank, 1, PAGE_SIZE) + top(Rank, 2, PAGE_SIZE) + top(Rank, 3, PAGE_SIZE)
+    assert [entry['username'] for entry in board] == players
+    for position in (0, PAGE_SIZE - 1, PAGE_SIZE, PAGE_SIZE * 2 + 4):
+        ranked = player_rank(Rank, players[position])
+        assert ranked['rank'] == position + 1
+        assert {k: v for k, v in ranked.items() if k != 'rank'} == board[position]
+    assert player_rank(Rank, 'nobody') is None
+
+
+def test_tied_players_share_a_rank(app):
+    record_attempt('herb', 'first', 90, 10)
+    record_attempt('herb', 'tie-a', 80, 10)
+    record_attempt('herb', 'tie-b', 80, 10)
+    record_attempt('herb', 'last', 70, 10)
+    assert [player_rank(Rank, name)['rank'] for name in ('first', 'tie-a', 'tie-b', 'last')] == [1, 2, 2, 4]
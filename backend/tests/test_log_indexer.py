@@ -0,0 +1,86 @@
+import shutil
+import threading
+
+from database import db, LogOffset
+from service import log_indexer
+from service.log_indexer import Indexer, totals
+
+SITE = log_indexer.SITE
+LINES = [
+    f'1.2.3.4 - - [19/May/2025:12:46:40 +0000] "GET /api/herbs/1 HTTP/1.0" 200 10 "{SITE}/herb" "ua"',
+    f'1.2.3.4 - - [19/May/2025:12:46:41 +0000] "GET /api/story/1/3 HTTP/1.0" 200 10 "{SITE}/story" "ua"',
+    f'1.2.3.4 - - [19/May/2025:13:02:00 +0000] "GET /api/prescriptions HTTP/1.0" 304 0 "-" "ua"',
+    f'1.2.3.4 - - [19/May/2025:13:05:00 +0000] "GET /api/herbs/2 HTTP/1.0" 404 10 "-" "ua"',
+]
+
+
+def write_log(base, lines):
+    path = base / 'logs' / 'gunicorn_access.log'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(line + '\n' for line in lines))
+    return path
+
+
+def test_moved_deployment_carries_on_from_the_saved_offset(app, tmp_path):
+    first = write_log(tmp_path / 'deploy-a', LINES)
+    Indexer(app.url_map, first).run()
+    counts = totals('page')
+    assert counts == {f'{SITE}/herb': 2, f'{SITE}/story': 1, f'{SITE}/prescription': 1}
+
+    # Same database, the tree copied to another directory
+    second = tmp_path / 'deploy-b' / 'logs' / 'gunicorn_access.log'
+    second.parent.mkdir(parents=True)
+    shutil.copy2(first, second)
+    assert Indexer(app.url_map, second).run() == 0
+    assert totals('page') == counts
+    assert totals('status') == {'200': 2, '304': 1, '404': 1}
+
+
+def test_new_log_under_the_same_name_is_read_from_the_start(app, tmp_path):
+    path = write_log(tmp_path, LINES)
+    Indexer(app.url_map, path).run()
+    # Replaced by a new file (new inode, other first line) with the old one gone
+    path.unlink()
+    write_log(tmp_path, LINES[2:])
+    Indexer(app.url_map, path).run()
+    assert totals('status') == {'200': 2, '304': 2, '404': 2}
+
+
+def test_offset_saved_under_an_absolute_path_is_kept(app, tmp_path):
+    path = write_log(tmp_path, LINES)
+    Indexer(app.url_map, path).run()
+    counts = totals('status')
+    # As saved before the offsets were keyed by file name
+    state = db.session.get(LogOffset, path.name)
+    db.session.delete(state)
+    db.session.add(LogOffset(path='/srv/old/logs/gunicorn_access.log', inode=state.inode, offset=state.offset))
+    db.session.commit()
+
+    assert Indexer(app.url_map, path).run() == 0
+    assert totals('status') == counts
+    assert [row.path for row in LogOffset.query.all()] == [path.name]
+
+
+def test_index_access_log_waits_for_a_running_pass(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_indexer, 'INDEX_LOCK', tmp_path / 'access_index.lock')
+    monkeypatch.setattr(log_indexer, 'ACCESS_LOG', write_log(tmp_path, LINES))
+    with open(log_indexer.INDEX_LOCK, 'w') as held:
+        assert log_indexer.lock(held, 0)
+        assert log_indexer.index_access_log(app, wait=0.2) is None
+        threading.Timer(0.2, log_indexer.fcntl.flock, (held, log_indexer.fcntl.LOCK_UN)).start()
+        assert log_indexer.index_access_log(app, wait=5) == sum(len(line) + 1 for line in LINES)
+
+
+def test_bounded_pass_leaves_the_rest_to_the_next_one(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_indexer, 'INDEX_LOCK', tmp_path / 'access_index.lock')
+    monkeypatch.setattr(log_indexer, 'ACCESS_LOG', write_log(tmp_path, LINES * 50))
+    monkeypatch.setattr(log_indexer, 'CHUNK_SIZE', 1024)
+    size = log_indexer.ACCESS_LOG.stat().st_size
+
+    done = log_indexer.index_access_log(app, max_bytes=log_indexer.CHUNK_SIZE)
+    assert 0 < done <= 1024
+    assert log_indexer.progress() == (done, size)
+
+    log_indexer.index_access_log(app)
+    assert log_indexer.progress() == (size, size)
+    assert totals('status') == {'200': 100, '304': 50, '404': 50}
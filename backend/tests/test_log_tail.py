@@ -0,0 +1,94 @@
+import os
+import random
+
+import pytest
+
+from service import log_tail
+from service.log_tail import InvalidCursor, decode_cursor, encode_cursor, line_filter, tail
+
+
+def write(path, text):
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def random_log(count, seed=2025):
+    rng = random.Random(seed)
+    # Lengths up to twice the block size, so that lines start, end and span block boundaries
+    return ''.join(f"{i} " + 'x' * rng.choice((0, 10, 200, log_tail.BLOCK_SIZE - 3, log_tail.BLOCK_SIZE * 2)) + '\n'
+                   for i in range(count))
+
+
+def read_all_pages(path, limit, keep=None):
+    """Every page from the end to the start, put back in file order"""
+    pages = []
+    cursor = None
+    while True:
+        lines, cursor = tail(path, limit, cursor, keep)
+        pages.insert(0, lines)
+        if cursor is None:
+            return [line for page in pages for line in page]
+
+
+@pytest.mark.parametrize('limit', [1, 7, 1000])
+def test_lines_spanning_blocks_match_readlines(tmp_path, limit):
+    text = random_log(200)
+    path = write(tmp_path / 'access.log', text)
+    assert os.path.getsize(path) > 10 * log_tail.BLOCK_SIZE
+    with open(path) as f:
+        expected = f.readlines()
+    assert tail(path, limit)[0] == expected[-limit:]
+    assert read_all_pages(path, limit) == expected
+
+
+def test_small_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_tail, 'BLOCK_SIZE', 5)
+    path = write(tmp_path / 'access.log', 'first\n\nsecond line\nthird, a longer line\n')
+    assert tail(path, 10)[0] == ['first\n', '\n', 'second line\n', 'third, a longer line\n']
+    assert read_all_pages(path, 1) == ['first\n', '\n', 'second line\n', 'third, a longer line\n']
+
+
+def test_no_trailing_newline(tmp_path):
+    path = write(tmp_path / 'access.log', 'one\ntwo\nthree')
+    assert tail(path, 2) == (['two\n', 'three'], encode_cursor(os.stat(path).st_ino, 4))
+    assert read_all_pages(path, 2) == ['one\n', 'two\n', 'three']
+
+
+def test_crlf_and_multibyte_lines(tmp_path):
+    path = write(tmp_path / 'error.log', '草药\r\n汤剂\r\n')
+    assert tail(path, 5) == (['草药\n', '汤剂\n'], None)
+
+
+def test_empty_and_missing_files(tmp_path):
+    assert tail(write(tmp_path / 'empty.log', ''), 10) == ([], None)
+    assert tail(write(tmp_path / 'newline.log', '\n'), 10) == (['\n'], None)
+    assert tail(str(tmp_path / 'missing.log'), 10) == ([], None)
+
+
+def test_filtered_pages(tmp_path):
+    lines = [f'1.2.3.4 - - [19/May/2025:12:00:{i % 60:02} +0000] "GET /api/herbs/{i} HTTP/1.0" '
+             f'{404 if i % 3 == 0 else 200} 10 "-" "ua"\n' for i in range(100)]
+    path = write(tmp_path / 'access.log', ''.join(lines))
+    keep = line_filter(status=404)
+    assert read_all_pages(path, 4, keep) == [line for i, line in enumerate(lines) if i % 3 == 0]
+
+
+def test_stale_cursor_after_rotation(tmp_path):
+    path = write(tmp_path / 'access.log', 'old 1\nold 2\nold 3\n')
+    _, cursor = tail(path, 1)
+    # Rotated: the old file moves away and a new one is created under the same name
+    os.rename(path, path + '.1')
+    write(tmp_path / 'access.log', 'new 1\nnew 2\n')
+    with pytest.raises(InvalidCursor):
+        tail(path, 1, cursor)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor(1, 2)[:-1] + '!'])
+def test_malformed_cursor(tmp_path, cursor):
+    path = write(tmp_path / 'access.log', 'a\nb\n')
+    with pytest.raises(InvalidCursor):
+        tail(path, 1, cursor)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1234, 5678), 1234) == 5678
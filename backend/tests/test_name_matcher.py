@@ -0,0 +1,66 @@
+import random
+
+import pytest
+from fuzzywuzzy import fuzz
+
+from service.catalog import Catalog
+from service.name_matcher import DEFAULT_THRESHOLD, NameMatcher
+
+
+@pytest.fixture(scope='module', params=['en', 'zh'])
+def names(request, seeded_app):
+    return list(Catalog(0).lang(request.param).herb_ids_by_lower_name)
+
+
+def misspell(name, rng):
+    """One typo: a character dropped, doubled, swapped with the next one or replaced"""
+    i = rng.randrange(len(name))
+    typo = rng.choice(('drop', 'double', 'swap', 'replace'))
+    if typo == 'drop' and len(name) > 1:
+        return name[:i] + name[i + 1:]
+    if typo == 'swap' and i < len(name) - 1:
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    if typo == 'replace':
+        return name[:i] + rng.choice(name) + name[i + 1:]
+    return name[:i] + name[i] + name[i:]
+
+
+def misspelled(names, count=150):
+    rng = random.Random(6006)
+    return [misspell(rng.choice(names), rng) for _ in range(count)] + ['', 'x', 'qqqqqqqq']
+
+
+def brute_force(names, query, reverse):
+    """Every name scored with fuzz.ratio, as the linking did before the index"""
+    return [(fuzz.ratio(name, query) if reverse else fuzz.ratio(query, name), name) for name in names]
+
+
+def best(scored, threshold=DEFAULT_THRESHOLD):
+    """Highest score reaching the threshold, the first name among equal ones"""
+    top = None
+    for score, name in scored:
+        if score >= threshold and (top is None or score > top[0]):
+            top = (score, name)
+    return top and top[1]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_best_match_is_that_of_a_full_scan(names, reverse):
+    matcher = NameMatcher(names)
+    found = 0
+    for query in misspelled(names):
+        expected = brute_force(names, query, reverse)
+        matches = matcher.match(query, reverse=reverse)
+        assert matches == [name for score, name in expected if score >= DEFAULT_THRESHOLD], query
+        scores = {name: score for score, name in expected}
+        assert best((scores[name], name) for name in matches) == best(expected), query
+        found += bool(matches)
+    assert found
+
+
+def test_other_thresholds(names):
+    matcher = NameMatcher(names)
+    for query in misspelled(names, 20):
+        for threshold in (60, 90, 100):
+            expected = [name for score, name in brute_force(names, query, False) if score >= threshold]
+            assert matcher.match(query, threshold) == expected, (query, threshold)
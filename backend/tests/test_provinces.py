@@ -0,0 +1,18 @@
+import seed
+from service.provinces import PROVINCES, load_boundaries, parse_provinces
+
+BOUNDARIES = load_boundaries()
+
+
+def test_every_province_has_a_boundary():
+    missing = [en for code, en, zh in PROVINCES if code not in BOUNDARIES]
+    assert not missing
+
+
+def test_seeded_herb_provinces_resolve_to_a_boundary():
+    for filename, lang in (('Updated_Constitutes_Data.csv', 'en'), ('chinese_constitutes_data_updated.csv', 'zh')):
+        named = set()
+        for row in seed.read_csv(filename):
+            named.update(parse_provinces(row[3], lang))
+        assert named, filename
+        assert named <= set(BOUNDARIES), (filename, named - set(BOUNDARIES))
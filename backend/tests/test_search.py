@@ -0,0 +1,45 @@
+import sqlite3
+
+from database import db, init_search
+from service.search import PAGE_SIZE, search
+
+HERB = ("INSERT INTO herb (id, name, category, origin, production_regions, properties, functions, "
+        "relate_prescription) VALUES (:id, :name, '', '', '', '', :functions, '[]')")
+
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+
+def test_plain_sqlite_client_can_write_searched_tables(app, tmp_path):
+    init_search()
+    db.session.commit()
+    # Through the sqlite3 module, without any function the app registers
+    connection = sqlite3.connect(tmp_path / 'database.db')
+    with connection:
+        connection.execute(HERB, {'id': 1, 'name': 'Ginseng', 'functions': 'Tonifies qi'})
+        connection.execute(HERB, {'id': 2, 'name': 'Licorice', 'functions': 'Harmonizes'})
+    assert names(search('herb', 'ginseng', 'en')) == ['Ginseng']
+
+    with connection:
+        connection.execute("UPDATE herb SET name = 'Panax Ginseng' WHERE id = 1")
+        connection.execute("DELETE FROM herb WHERE id = 2")
+    connection.close()
+    assert names(search('herb', 'panax', 'en')) == ['Panax Ginseng']
+    assert search('herb', 'licorice', 'en') == []
+
+
+def test_rows_written_by_the_app_are_searchable(app):
+    init_search()
+    db.session.execute(db.text(HERB), {'id': 1, 'name': '人参', 'functions': '大补元气'})
+    db.session.commit()
+    assert names(search('herb', '元气', 'en')) == ['人参']
+
+
+def test_every_match_unless_paged(seeded_app):
+    everything = search('prescription', 'Decoction', 'en')
+    assert len(everything) > PAGE_SIZE
+    assert len(search('prescription', 'Decoction', 'en', page=1)) == PAGE_SIZE
+    pages = search('prescription', 'Decoction', 'en', page=1, page_size=20) + \
+        search('prescription', 'Decoction', 'en', page=2, page_size=20)
+    assert pages == everything[:40]
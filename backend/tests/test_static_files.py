@@ -0,0 +1,44 @@
+import gzip
+import os
+
+import pytest
+from flask import Flask
+
+from service.static_files import send_compressed
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__, root_path=str(tmp_path))
+
+    @app.route('/')
+    def index():
+        return send_compressed('templates', 'index.html')
+    return app
+
+
+def build(tmp_path, html):
+    source = tmp_path / 'templates' / 'index.html'
+    source.parent.mkdir(exist_ok=True)
+    source.write_text(html)
+    (tmp_path / 'templates' / 'index.html.gz').write_bytes(gzip.compress(html.encode()))
+    return source
+
+
+def test_sidecar_is_served_when_current(app, tmp_path):
+    build(tmp_path, '<html>v1</html>')
+    response = app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.content_encoding == 'gzip'
+    assert gzip.decompress(response.data) == b'<html>v1</html>'
+
+
+def test_stale_sidecar_is_not_served(app, tmp_path):
+    source = build(tmp_path, '<html>v1</html>')
+    # A new build copied in without rerunning compress_static.py
+    source.write_text('<html>v2</html>')
+    sidecar = os.stat(str(source) + '.gz')
+    os.utime(source, (sidecar.st_atime, sidecar.st_mtime + 1))
+    response = app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.content_encoding is None
+    assert response.data == b'<html>v2</html>'
+    assert 'Accept-Encoding' in response.vary
@@ -18,11 +18,7 @@ api.interceptors.response.use(
         const res = error.response;
         // 当后端返回 401（需要重新授权）时，跳转到后端发起授权
         if (res && res.status === 401) {
-            // 根据当前环境，拼出后端授权链接地址
-            const backendBase = window.location.origin.includes('localhost')
-                ? 'http://127.0.0.1:5000'
-                : '';
-            window.location.href = `${backendBase}/api/chat/auth-url`;
+            redirectToAuth();
             // 返回一个永远 pending 的 Promise，阻止后续 then/catch
             return new Promise(() => {});
         }
@@ -40,6 +36,83 @@ export function sendUserMessage(lang, question) {
     return api.post('/BianQue', { lang, question })
 }
 
+// 后端授权地址：401 时跳转过去
+function redirectToAuth() {
+    const backendBase = window.location.origin.includes('localhost')
+        ? 'http://127.0.0.1:5000'
+        : '';
+    window.location.href = `${backendBase}/api/chat/auth-url`;
+}
+
+/**
+ * 流式发送聊天请求：POST /api/chat/BianQue/stream，以 Server-Sent Events 逐段返回回答
+ * （event: message {"delta": ...}，然后 done 或 error）。
+ * 每收到一段就调用 onDelta(delta, text)，text 是目前为止的完整回答；Promise 在 done 时返回完整回答。
+ * 浏览器不支持读取流时退回一次性的 sendUserMessage。
+ * @param {string} lang     zh 或 en
+ * @param {string} question 用户的问题
+ * @param {function} onDelta 每段回答的回调
+ */
+export async function streamUserMessage(lang, question, onDelta) {
+    if (!window.ReadableStream || !window.TextDecoder) {
+        const response = await sendUserMessage(lang, question);
+        const text = (response.data && response.data.message) || '';
+        onDelta(text, text);
+        return text;
+    }
+
+    const response = await fetch(`${api.defaults.baseURL}/BianQue/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({ lang, question }),
+    });
+    if (response.status === 401) {
+        redirectToAuth();
+        // 和拦截器一样，返回一个永远 pending 的 Promise
+        return new Promise(() => {});
+    }
+    if (!response.ok) {
+        // 429 / 503（模型繁忙，带 Retry-After）或 500
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+        // 事件之间以空行分隔，最后一段可能还不完整
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+            let name = 'message';
+            const data = [];
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event:')) name = line.slice(6).trim();
+                else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                // 以 ':' 开头的是心跳注释，忽略
+            }
+            if (!data.length) continue;
+            const payload = JSON.parse(data.join('\n'));
+            if (name === 'message') {
+                text += payload.delta;
+                onDelta(payload.delta, text);
+            } else if (name === 'error') {
+                reader.cancel();
+                throw new Error(payload.error);
+            } else if (name === 'done') {
+                reader.cancel();
+                return text;
+            }
+        }
+    }
+    return text;
+}
+
 /**
  * Request Method: POST
  *
@@ -137,6 +137,51 @@ export const getHerbIds = async (lang = 'zh') => {
     }
 };
 
+/**
+ * Get a whole herb image quiz round in one request (every question with its image and options)
+ *
+ * Request method: GET
+ * Request URL: `${API_BASE_URL}/tcm/herb-quiz/round?lang=zh`
+ * Query Parameters:
+ *   - lang: optional, language ('zh' for Chinese, 'en' for English); default: 'zh'
+ *   - count: optional, number of questions; default: 5
+ *   - seed: optional, the same seed gives the same round
+ *
+ * Example request:
+ *   GET /api/tcm/herb-quiz/round?lang=zh
+ *
+ * Example response:
+ * {
+ *   "seed": 3021458761,
+ *   "questions": [
+ *     {
+ *       "id": 12,
+ *       "imageUrl": "http://example.com/herb12.jpg",
+ *       "name": "黄芪",
+ *       "options": ["当归", "黄芪", "甘草", "党参"],
+ *       "answer": 1
+ *     },
+ *     ...
+ *   ]
+ * }*/
+/**
+ * Get a herb quiz round
+ * @param {String} lang language (default 'zh')
+ * @returns {Array} the questions, empty if the request fails
+ */
+export const getHerbQuizRound = async (lang = 'zh') => {
+    try {
+        const response = await axios.get(`${API_BASE_URL}/tcm/herb-quiz/round`, {
+            params: { lang }
+        });
+
+        return response.data.questions;
+    } catch (error) {
+        console.error('获取药材测验题目失败：', error);
+        return [];
+    }
+};
+
 /**
  * Get herb details for a single herb (used in quiz, includes image and options)
  *
@@ -1,5 +1,59 @@
 import axios from 'axios';
 
+/**
+ * Get a whole story in one request: every node with its next ids, and the assets it uses.
+ *
+ * Request method: GET
+ * Request URL: `/api/story/{storyNumber}/bundle`
+ * Path Parameters:
+ *   - storyNumber: required, number (the story, not a node id)
+ *
+ * Example request:
+ *   GET /api/story/1/bundle
+ *
+ * Example response:
+ * {
+ *   "story_number": 1,
+ *   "start": 1,
+ *   "nodes": {
+ *     "1": { "story_number": 1, "id": 1, "next_id": [2], ...[other fields, as in fetchStoryData]... },
+ *     ...
+ *   },
+ *   "manifest": {
+ *     "backgrounds": ["/static/..."],
+ *     "character_images": ["/static/..."],
+ *     "audio": ["storm.mp3"]
+ *   }
+ * }
+ *
+ * Error response:
+ * {
+ *   "message": "Story not found"
+ * }*/
+export const fetchStoryBundle = async (storyNumber) => {
+    try {
+        const response = await axios.get(`/api/story/${storyNumber}/bundle`);
+        return response.data;
+    } catch (error) {
+        console.error('获取完整剧情失败:', error);
+        return null; // If it fails, null is returned and the nodes are fetched one by one
+    }
+};
+
+/**
+ * The node a choice leads to within a bundle, as /api/story/next does: dangling next ids are skipped.
+ *
+ * Returns:
+ *   The next node, or null if the selection is invalid.
+ */
+export const nextBundleNode = (bundle, currentStoryId, optionIndex) => {
+    const current = bundle.nodes[currentStoryId];
+    const successors = (current?.next_id || [])
+        .map(id => bundle.nodes[id])
+        .filter(Boolean);
+    return successors[optionIndex] || null;
+};
+
 /**
  * Get data for a specific story segment (episode/node).
  *